@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Query plan auditor for the SwapFlow API.
+
+Exercises the API in-process against an existing dataset (e.g. one made by
+generate_dataset.py), captures every Mongo query the endpoints issue with a
+command listener, de-duplicates them by shape, then runs explain() on one
+instance of each shape. The report flags collection scans, in-memory sorts
+and high docs-examined/returned ratios, and suggests an index for each
+flagged shape using the equality-sort-range rule.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=swapflow_capacity python audit_query_plans.py
+    python audit_query_plans.py --include-writes --json plans.json
+
+Only the app's indexes and caches are set up; its background loops (message
+archive, deletion worker, counter reconciliation) are not started, so the
+dataset stays as loaded while it is audited. --include-writes pins and unpins
+an item, sends a message and opens a trade; afterwards the message and trade
+are deleted, a pin the user already had is restored and the counter and
+rollup bumps are reverted.
+
+Exits with status 1 if any shape is flagged, so it can gate CI.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_capacity")
+
+import httpx
+from pymongo import monitoring
+
+# Commands whose plans are worth explaining
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Session and routing fields pymongo adds that explain must not carry
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern"}
+
+
+# Endpoint being audited. Like server.py's request stats, Motor copies it onto its
+# executor threads, so commands from background tasks carry no label.
+current_label: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_label", default=None)
+
+
+class CaptureListener(monitoring.CommandListener):
+    """Records the first instance of each command shape issued on behalf of an audited endpoint"""
+
+    def __init__(self):
+        self.shapes = {}  # shape -> {"command_name", "command", "endpoints"}
+
+    def started(self, event):
+        label = current_label.get()
+        if label is None or event.command_name not in EXPLAINABLE:
+            return
+        import server
+        shape = server.command_shape(event.command_name, event.command)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = {
+                "command_name": event.command_name,
+                "command": {key: value for key, value in event.command.items() if key not in DRIVER_FIELDS},
+                "endpoints": []
+            }
+        if label not in entry["endpoints"]:
+            entry["endpoints"].append(label)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Must be registered before server.py creates its client
+listener = CaptureListener()
+monitoring.register(listener)
+
+import server
+
+
+def walk_plan(plan, stages):
+    """Collect stage names (and index names) from a winning plan tree"""
+    if not isinstance(plan, dict):
+        return
+    stage = plan.get("stage")
+    if stage:
+        stages.append(f"{stage}({plan['indexName']})" if "indexName" in plan else stage)
+    for key in ("inputStage", "queryPlan"):
+        walk_plan(plan.get(key), stages)
+    for child in plan.get("inputStages", []):
+        walk_plan(child, stages)
+
+
+def find_key(document, key):
+    """First value stored under key anywhere in a nested explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def query_parts(command_name, command):
+    """(filter, sort) the server will plan for this command"""
+    if command_name == "find":
+        return command.get("filter") or {}, command.get("sort") or {}
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query") or {}, command.get("sort") or {}
+    if command_name in ("update", "delete"):
+        statement = (command.get(f"{command_name}s") or [{}])[0]
+        return statement.get("q") or {}, {}
+    if command_name == "aggregate":
+        query, sort = {}, {}
+        for stage in command.get("pipeline", []):
+            if "$match" in stage and not query:
+                query = stage["$match"]
+            elif "$sort" in stage and not sort:
+                sort = stage["$sort"]
+            elif not ({"$match", "$sort"} & set(stage)):
+                break
+        return query, sort
+    return {}, {}
+
+
+def recommend_index(query, sort):
+    """
+    Suggest compound index keys: equality fields, then sort fields, then range fields.
+
+    Returns a list of suggestions (one per $or branch when the query is an $or)
+    and notes about predicates no index can serve well.
+    """
+    notes = []
+
+    def fields(predicate):
+        equality, ranges = [], []
+        for field, condition in predicate.items():
+            if field in ("$or", "$and"):
+                continue
+            if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+                if "$regex" in condition:
+                    pattern = str(condition["$regex"])
+                    if not pattern.startswith("^") or "i" in str(condition.get("$options", "")):
+                        notes.append(f"unanchored or case-insensitive regex on '{field}' scans the whole index; consider a text index")
+                        continue
+                if set(condition) <= {"$eq", "$in"}:
+                    equality.append(field)
+                else:
+                    ranges.append(field)
+            else:
+                equality.append(field)
+        return equality, ranges
+
+    def keys_for(predicate):
+        equality, ranges = fields(predicate)
+        keys = [(field, 1) for field in equality]
+        keys += [(field, direction) for field, direction in sort.items() if field not in equality]
+        keys += [(field, 1) for field in ranges if field not in sort]
+        return keys
+
+    branches = query.get("$or") if isinstance(query.get("$or"), list) else None
+    base = {field: condition for field, condition in query.items() if field != "$or"}
+    if branches:
+        suggestions = [keys_for({**base, **branch}) for branch in branches]
+    else:
+        suggestions = [keys_for(query)]
+    return [keys for keys in suggestions if keys], notes
+
+
+def explain_command(command_name, command):
+    """Wrap a captured command in an explain the server accepts"""
+    target = dict(command)
+    if command_name == "aggregate":
+        target.setdefault("cursor", {})
+    if command_name in ("update", "delete"):
+        target[f"{command_name}s"] = target[f"{command_name}s"][:1]
+    return {"explain": target, "verbosity": "executionStats"}
+
+
+class QueryPlanAuditor:
+    def __init__(self, args):
+        self.args = args
+        self.cleanup = []  # (collection, filter) of temporary docs to delete when done
+        # Platform counter and daily rollup bumps made by --include-writes, reverted when done
+        self.counter_deltas = {}
+        self.rollup_deltas = {}
+        self.results = []
+
+    async def session_for(self, user_id):
+        """Temporary session so the auditor can call endpoints as an existing user"""
+        token = f"audit_{uuid.uuid4().hex}"
+        now = datetime.now(timezone.utc)
+        await server.db.user_sessions.insert_one({
+            "user_id": user_id,
+            "session_token": token,
+            "expires_at": (now + timedelta(hours=1)).isoformat(),
+            "created_at": now.isoformat()
+        })
+        self.cleanup.append((server.db.user_sessions, {"session_token": token}))
+        return token
+
+    async def sample(self):
+        """Pick realistic ids from the dataset to call endpoints with"""
+        db = server.db
+        message = await db.messages.find_one({}, {"_id": 0, "sender_id": 1, "receiver_id": 1})
+        user = await db.users.find_one(
+            {"user_id": message["sender_id"]} if message else {"is_admin": {"$ne": True}},
+            {"_id": 0, "user_id": 1}
+        )
+        if not user:
+            sys.exit("Dataset has no users; load one with generate_dataset.py first")
+        item = await db.items.find_one({"is_available": True}, {"_id": 0, "item_id": 1, "user_id": 1, "category": 1})
+        trade = await db.trades.find_one({"trader_id": user["user_id"]}, {"_id": 0, "trade_id": 1})
+        category = await db.categories.find_one({"level": 0}, {"_id": 0, "name": 1})
+
+        admin = await db.users.find_one({"is_admin": True}, {"_id": 0, "user_id": 1})
+        if not admin:
+            admin = {"user_id": f"audit_admin_{uuid.uuid4().hex[:8]}"}
+            await db.users.insert_one({**admin, "email": f"{admin['user_id']}@example.com", "name": "Audit", "is_admin": True, "portfolio": []})
+            self.cleanup.append((db.users, {"user_id": admin["user_id"]}))
+
+        return {
+            "user_id": user["user_id"],
+            "partner_id": (message or {}).get("receiver_id", user["user_id"]),
+            "item_id": item["item_id"] if item else "missing",
+            "owner_id": item["user_id"] if item else "missing",
+            "category": (category or item or {}).get("name") or (item or {}).get("category", "missing"),
+            "trade_id": trade["trade_id"] if trade else "missing",
+            "token": await self.session_for(user["user_id"]),
+            "admin_token": await self.session_for(admin["user_id"])
+        }
+
+    def endpoints(self, ids):
+        """(label, method, url, token kind, kwargs) for every endpoint to exercise"""
+        reads = [
+            ("GET /api/items", "GET", "/api/items", "user", {}),
+            ("GET /api/items?category", "GET", "/api/items", "user", {"params": {"category": ids["category"]}}),
+            ("GET /api/items?user_id", "GET", "/api/items", "user", {"params": {"user_id": ids["owner_id"]}}),
+            ("GET /api/items/{item_id}", "GET", f"/api/items/{ids['item_id']}", "user", {}),
+            ("GET /api/my-items", "GET", "/api/my-items", "user", {}),
+            ("GET /api/items/{item_id}/pin-status", "GET", f"/api/items/{ids['item_id']}/pin-status", "user", {}),
+            ("GET /api/users/{user_id}/portfolio", "GET", f"/api/users/{ids['owner_id']}/portfolio", "user", {}),
+            ("GET /api/categories", "GET", "/api/categories", "user", {"params": {"level": 1, "parent": ids["category"]}}),
+            ("GET /api/conversations", "GET", "/api/conversations", "user", {}),
+            ("GET /api/messages/{partner_id}", "GET", f"/api/messages/{ids['partner_id']}", "user", {}),
+            ("GET /api/trades", "GET", "/api/trades", "user", {}),
+            ("GET /api/trades/{trade_id}", "GET", f"/api/trades/{ids['trade_id']}", "user", {}),
+            ("GET /api/search", "GET", "/api/search", "user", {"params": {"q": "am"}}),
+            ("GET /api/announcements", "GET", "/api/announcements", "user", {}),
+            ("GET /api/category-requests/mine", "GET", "/api/category-requests/mine", "user", {}),
+            ("GET /api/admin/users", "GET", "/api/admin/users", "admin", {"params": {"search": "am"}}),
+            ("GET /api/admin/items", "GET", "/api/admin/items", "admin", {}),
+            ("GET /api/admin/reports", "GET", "/api/admin/reports", "admin", {"params": {"status": "pending"}}),
+            ("GET /api/admin/category-requests", "GET", "/api/admin/category-requests", "admin", {}),
+            ("GET /api/admin/deletion-jobs", "GET", "/api/admin/deletion-jobs", "admin", {})
+        ]
+        writes = [
+            ("POST /api/items/{item_id}/pin", "POST", f"/api/items/{ids['item_id']}/pin", "user", {}),
+            ("DELETE /api/items/{item_id}/pin", "DELETE", f"/api/items/{ids['item_id']}/pin", "user", {}),
+            ("POST /api/messages", "POST", "/api/messages", "user", {"json": {"receiver_id": ids["partner_id"], "content": "audit"}}),
+            ("POST /api/trades", "POST", "/api/trades", "user", {"json": {"item_id": ids["item_id"], "owner_id": ids["owner_id"]}})
+        ]
+        return reads + (writes if self.args.include_writes else [])
+
+    def track_write(self, label, response, existing_trade):
+        """Queue the undo of whatever an --include-writes endpoint changed"""
+        if response.status_code >= 400:
+            return
+        body = response.json()
+        if label == "POST /api/items/{item_id}/pin":
+            self.rollup_deltas["pins"] = self.rollup_deltas.get("pins", 0) - 1
+        elif label == "POST /api/messages":
+            self.cleanup.append((server.db.messages, {"message_id": body["message_id"]}))
+        elif label == "POST /api/trades" and body["trade_id"] != (existing_trade or {}).get("trade_id"):
+            self.cleanup.append((server.db.trades, {"trade_id": body["trade_id"]}))
+            self.counter_deltas["trades_total"] = self.counter_deltas.get("trades_total", 0) - 1
+            self.rollup_deltas["trades_opened"] = self.rollup_deltas.get("trades_opened", 0) - 1
+
+    async def capture(self):
+        ids = await self.sample()
+        # create_trade returns an open trade the user already has instead of opening one
+        existing_trade = await server.db.trades.find_one(
+            {"item_id": ids["item_id"], "trader_id": ids["user_id"], "is_completed": False},
+            {"_id": 0, "trade_id": 1}
+        )
+        # The unpin call deletes this pin whether or not the audit created it
+        existing_pin = await server.db.pins.find_one({"item_id": ids["item_id"], "user_id": ids["user_id"]}, {"_id": 0})
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://audit", timeout=120) as http:
+            for label, method, url, token_kind, kwargs in self.endpoints(ids):
+                token = ids["admin_token"] if token_kind == "admin" else ids["token"]
+                label_token = current_label.set(label)
+                try:
+                    response = await http.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+                finally:
+                    current_label.reset(label_token)
+                if response.status_code >= 400:
+                    print(f"  {label}: HTTP {response.status_code} (shapes still captured)", file=sys.stderr)
+                self.track_write(label, response, existing_trade)
+
+        if existing_pin and not await server.db.pins.find_one({"pin_id": existing_pin["pin_id"]}, {"_id": 1}):
+            await server.db.pins.insert_one(existing_pin.copy())
+            await server.update_item_boost(ids["item_id"])
+
+    async def explain_all(self):
+        for shape, entry in sorted(listener.shapes.items()):
+            command_name, command = entry["command_name"], entry["command"]
+            try:
+                explained = await server.db.command(explain_command(command_name, command))
+            except Exception as e:
+                self.results.append({"shape": shape, "endpoints": entry["endpoints"], "error": str(e), "flags": []})
+                continue
+
+            stages = []
+            walk_plan(find_key(explained, "winningPlan"), stages)
+            docs_examined = find_key(explained, "totalDocsExamined") or 0
+            keys_examined = find_key(explained, "totalKeysExamined") or 0
+            returned = find_key(explained, "nReturned") or 0
+            ratio = docs_examined / max(returned, 1)
+
+            flags = []
+            if any(stage.startswith("COLLSCAN") for stage in stages):
+                flags.append("COLLSCAN")
+            if any(stage == "SORT" for stage in stages):
+                flags.append("IN_MEMORY_SORT")
+            if ratio > self.args.ratio_threshold and docs_examined >= self.args.min_docs:
+                flags.append(f"EXAMINED/RETURNED={ratio:.0f}")
+
+            query, sort = query_parts(command_name, command)
+            suggestions, notes = recommend_index(query, sort) if flags else ([], [])
+            collection = command.get(command_name)
+            self.results.append({
+                "shape": shape,
+                "endpoints": entry["endpoints"],
+                "plan": stages,
+                "docs_examined": docs_examined,
+                "keys_examined": keys_examined,
+                "returned": returned,
+                "flags": flags,
+                "recommended_indexes": [
+                    f"db.{collection}.createIndex({{{', '.join(f'{field!r}: {direction}' for field, direction in keys)}}})"
+                    for keys in suggestions
+                ],
+                "notes": notes
+            })
+
+    def print_report(self):
+        flagged = [result for result in self.results if result["flags"] or result.get("error")]
+        for result in sorted(self.results, key=lambda r: (not r["flags"], r["shape"])):
+            marker = "❌" if result["flags"] else ("⚠️" if result.get("error") else "✅")
+            print(f"\n{marker} {result['shape']}")
+            print(f"   endpoints: {', '.join(result['endpoints'])}")
+            if result.get("error"):
+                print(f"   explain failed: {result['error']}")
+                continue
+            print(f"   plan: {' <- '.join(result['plan']) or 'n/a'}")
+            print(f"   examined {result['docs_examined']} docs / {result['keys_examined']} keys, returned {result['returned']}")
+            for flag in result["flags"]:
+                print(f"   flag: {flag}")
+            for index in result["recommended_indexes"]:
+                print(f"   recommend: {index}")
+            for note in result["notes"]:
+                print(f"   note: {note}")
+        print(f"\n📊 {len(self.results)} query shapes, {len(flagged)} flagged")
+        return flagged
+
+    async def run(self):
+        # Indexes and caches the app sets up on startup are part of the audited state;
+        # its background loops are not, since they would rewrite the data mid-audit
+        await server.ensure_indexes()
+        await server.preload_hot_data()
+        try:
+            await self.capture()
+            await self.explain_all()
+        finally:
+            # Deleted only now: Motor starts an operation as soon as it is called
+            for collection, query in self.cleanup:
+                await collection.delete_one(query)
+            if self.counter_deltas:
+                await server.bump_counters(**self.counter_deltas)
+            if self.rollup_deltas:
+                await server.bump_daily_rollup(**self.rollup_deltas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain every query shape the API issues and flag slow plans")
+    parser.add_argument("--include-writes", action="store_true", help="also exercise pin/unpin, messaging and trade creation")
+    parser.add_argument("--ratio-threshold", type=float, default=10.0, help="flag when docs examined exceed returned by this factor")
+    parser.add_argument("--min-docs", type=int, default=100, help="ignore ratios on queries examining fewer docs than this")
+    parser.add_argument("--json", dest="json_path", help="also write the full report as JSON")
+    args = parser.parse_args()
+
+    auditor = QueryPlanAuditor(args)
+    asyncio.run(auditor.run())
+    flagged = auditor.print_report()
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(auditor.results, f, indent=2, sort_keys=True, default=str)
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for pure hot-path functions in server.py.
+
+Covers boost scoring, stored-datetime parsing, pydantic model construction and
+feed serialization. Each benchmark is timed with timeit (auto-ranged loop
+count, best of --repeat runs) and reported as seconds per call.
+
+    python bench_hot_paths.py --save-baseline            # record on a quiet machine
+    python bench_hot_paths.py --compare --threshold 0.15 # exit 1 on >15% regression
+
+Baselines are machine-specific; record them on the machine that will run the
+comparison.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+# server.py connects lazily, so importing it only needs the settings present
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_bench")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import server
+
+DEFAULT_BASELINE = Path(__file__).parent / "benchmarks" / "baseline.json"
+NOW = datetime.now(timezone.utc)
+
+
+def make_pins(count):
+    """Pins spread over the last 60 days, as ISO strings like the database stores them"""
+    return [
+        {"user_id": f"user_{i}", "item_id": "item_x", "created_at": (NOW - timedelta(hours=i * 60 * 24 / max(count, 1))).isoformat()}
+        for i in range(count)
+    ]
+
+
+def make_user():
+    return {
+        "user_id": "user_abc123def456",
+        "email": "someone@example.com",
+        "name": "Some One",
+        "username": "someone",
+        "picture": "https://example.com/avatar.png",
+        "trade_points": 12,
+        "rating": None,
+        "rating_count": 7,
+        "rating_sum": 31,
+        "rating_histogram": {"1": 0, "2": 1, "3": 1, "4": 2, "5": 3},
+        "is_admin": False,
+        "is_suspended": False,
+        "portfolio": [f"item_{i:012d}" for i in range(7)],
+        "created_at": NOW.isoformat()
+    }
+
+
+def make_feed(count=100):
+    return [
+        server.Item(
+            user_id=f"user_{i % 20}",
+            title=f"Item number {i}",
+            description="A perfectly ordinary thing to trade " * 3,
+            image="data:image/png;base64," + "A" * 2048,
+            category="electronics",
+            subcategory="audio",
+            bottom_category="headphones",
+            boost_score=float(100 - i),
+            pin_count=i
+        ).model_dump()
+        for i in range(count)
+    ]
+
+
+def bench_parse_session_expiry():
+    expires_at = (NOW + timedelta(days=7)).isoformat()
+    return lambda: server.parse_utc_datetime(expires_at) < datetime.now(timezone.utc)
+
+
+def bench_feed_created_at_parsing():
+    """The per-item created_at conversion get_items runs on a full page"""
+    items = [{"created_at": (NOW - timedelta(minutes=i)).isoformat()} for i in range(100)]
+
+    def run():
+        for item in items:
+            if isinstance(item.get("created_at"), str):
+                datetime.fromisoformat(item["created_at"])
+    return run
+
+
+def bench_boost_score(count):
+    pins = make_pins(count)
+    return lambda: server.calculate_boost_score(pins)
+
+
+def bench_user_model():
+    user = make_user()
+    return lambda: server.User(**server.derive_rating(dict(user)))
+
+
+def bench_item_model_dump():
+    return lambda: server.Item(
+        user_id="user_abc123def456",
+        title="Vintage camera",
+        description="Works great",
+        image="data:image/png;base64,AAAA",
+        category="electronics",
+        subcategory="cameras",
+        bottom_category="film"
+    ).model_dump()
+
+
+def bench_feed_serialization():
+    feed = make_feed(100)
+    # What FastAPI does with a returned list: encode, then render JSON
+    return lambda: JSONResponse(content=jsonable_encoder(feed)).body
+
+
+BENCHMARKS = {
+    "calculate_boost_score[10]": lambda: bench_boost_score(10),
+    "calculate_boost_score[1k]": lambda: bench_boost_score(1_000),
+    "calculate_boost_score[100k]": lambda: bench_boost_score(100_000),
+    "get_current_user.parse_expires_at": bench_parse_session_expiry,
+    "get_items.parse_created_at[100]": bench_feed_created_at_parsing,
+    "User(**user)": bench_user_model,
+    "Item(...).model_dump()": bench_item_model_dump,
+    "serialize_feed[100]": bench_feed_serialization
+}
+
+
+def run_benchmarks(selected, repeat):
+    results = {}
+    for name in selected:
+        fn = BENCHMARKS[name]()
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = best
+        print(f"{name:40s} {best * 1e6:12.2f} us/call", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks slower than baseline by more than threshold"""
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = seconds / previous - 1
+        marker = "REGRESSION" if change > threshold else "ok"
+        print(f"{name:40s} {change * 100:+8.1f}%  {marker}", file=sys.stderr)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for server.py hot paths")
+    parser.add_argument("-k", dest="keyword", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per benchmark; the best is kept")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown before failing (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    selected = [name for name in BENCHMARKS if not args.keyword or args.keyword in name]
+    results = run_benchmarks(selected, args.repeat)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+            sys.exit(2)
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Multi-worker cache coherence check for the SwapFlow API.
+
+Starts several uvicorn processes on one database, warms each one's in-process
+caches, then writes through one worker and polls the others until they serve
+the new state. Covers the settings cache, the category tree and the search
+cache, and reports how long each invalidation took to reach every worker.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=swapflow_coherence python cache_coherence_test.py --workers 3
+
+Exits non-zero if any worker is still stale after --max-staleness seconds.
+DB_NAME is dropped before seeding.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_coherence")
+
+import httpx
+
+import server
+
+ADMIN_ID = "coherence_admin"
+ADMIN_TOKEN = "token_coherence_admin"
+POLL_INTERVAL = 0.02
+
+
+class CacheCoherenceTester:
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+        self.urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers)]
+        self.failures = []
+        self.http = None
+
+    async def seed(self):
+        """Fresh database with one admin session to write through"""
+        now = datetime.now(timezone.utc)
+        await server.client.drop_database(os.environ["DB_NAME"])
+        await server.db.users.insert_one({
+            "user_id": ADMIN_ID,
+            "email": f"{ADMIN_ID}@example.com",
+            "name": "Coherence Admin",
+            "username": "coherenceadmin",
+            "picture": None,
+            "trade_points": 0,
+            "rating": None,
+            "rating_count": 0,
+            "rating_sum": 0,
+            "rating_histogram": server.empty_rating_histogram(),
+            "is_admin": True,
+            "portfolio": [],
+            "created_at": now.isoformat()
+        })
+        await server.db.user_sessions.insert_one({
+            "user_id": ADMIN_ID,
+            "session_token": ADMIN_TOKEN,
+            "expires_at": (now + timedelta(days=1)).isoformat(),
+            "created_at": now.isoformat()
+        })
+
+    async def start_workers(self):
+        for i, url in enumerate(self.urls):
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server:app", "--port", str(self.args.base_port + i), "--log-level", "warning"],
+                cwd=Path(__file__).parent,
+                env=os.environ.copy()
+            ))
+        deadline = time.monotonic() + 30
+        for url in self.urls:
+            while True:
+                try:
+                    if (await self.http.get(f"{url}/readyz")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Worker at {url} did not start")
+                await asyncio.sleep(0.2)
+
+    def stop_workers(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=10)
+
+    async def get(self, url, path, **kwargs):
+        response = await self.http.get(f"{url}{path}", headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def wait_until(self, url, path, predicate, **kwargs):
+        """Poll a worker until predicate(response) holds; returns seconds waited or None if it stayed stale"""
+        start = time.perf_counter()
+        while True:
+            if predicate(await self.get(url, path, **kwargs)):
+                return time.perf_counter() - start
+            if time.perf_counter() - start > self.args.max_staleness:
+                return None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def check(self, name, path, write, predicate, **kwargs):
+        """Warm every worker, write through the first, then time how long the others stay stale"""
+        for url in self.urls:
+            await self.get(url, path, **kwargs)
+        await write(self.urls[0])
+        delays = await asyncio.gather(*[
+            self.wait_until(url, path, predicate, **kwargs) for url in self.urls[1:]
+        ])
+        stale = [url for url, delay in zip(self.urls[1:], delays) if delay is None]
+        if stale:
+            self.failures.append(name)
+            print(f"❌ {name} - still stale after {self.args.max_staleness}s on {', '.join(stale)}")
+        else:
+            print(f"✅ {name} - applied everywhere within {max(delays) * 1000:.0f}ms")
+
+    async def run_checks(self):
+        headers = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        new_limit = 11
+        category = f"coherence{uuid.uuid4().hex[:6]}"
+
+        async def update_settings(url):
+            response = await self.http.put(f"{url}/api/admin/settings", params={"max_portfolio_items": new_limit}, headers=headers)
+            response.raise_for_status()
+
+        async def create_category(url):
+            response = await self.http.post(f"{url}/api/admin/categories", json={"name": category}, headers=headers)
+            response.raise_for_status()
+
+        await self.check(
+            "settings cache", "/api/settings", update_settings,
+            lambda settings: settings["max_portfolio_items"] == new_limit
+        )
+        # Warm the search cache for the category before it exists
+        for url in self.urls:
+            await self.get(url, "/api/search", params={"q": category})
+        await self.check(
+            "category tree", "/api/categories/tree", create_category,
+            lambda roots: any(root["name"] == category for root in roots)
+        )
+        await self.check(
+            "search cache", "/api/search", lambda url: asyncio.sleep(0),
+            lambda results: any(cat["name"] == category for cat in results["categories"]),
+            params={"q": category}
+        )
+
+    async def run(self):
+        await self.seed()
+        async with httpx.AsyncClient(timeout=10) as http:
+            self.http = http
+            try:
+                await self.start_workers()
+                await self.run_checks()
+            finally:
+                self.stop_workers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that cache invalidations reach every uvicorn worker")
+    parser.add_argument("--workers", type=int, default=3, help="uvicorn processes to start")
+    parser.add_argument("--base-port", type=int, default=8101, help="port of the first worker; others follow")
+    parser.add_argument("--max-staleness", type=float, default=2.0, help="seconds a worker may serve stale data")
+    args = parser.parse_args()
+
+    print(f"🚀 Checking cache coherence across {args.workers} workers")
+    print("=" * 60)
+    tester = CacheCoherenceTester(args)
+    asyncio.run(tester.run())
+    print("=" * 60)
+    if tester.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
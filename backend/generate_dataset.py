@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for capacity testing.
+
+Bulk-loads users, sessions, a three-level category tree, items with images,
+pins with a realistic age distribution, messages, trades and reports into a
+local MongoDB. Documents are produced as streams and written with unordered
+insert_many batches, several batches in flight at once. Every collection is
+generated from its own seeded random stream, so the same arguments always
+produce the same data.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=swapflow_capacity \\
+        python generate_dataset.py --users 200000 --items-per-user 5 --drop
+
+Completed trades leave their item unavailable and credit both parties a
+trade point. After loading, derived data (item boost scores, rating
+aggregates, platform counters and daily rollups) is brought up to date so the
+app sees a consistent database. A failed batch aborts the run with its error.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_capacity")
+
+from pymongo import UpdateOne
+
+import server
+
+WORDS = [
+    "amber", "basil", "cedar", "delta", "ember", "fable", "gamma", "harbor", "indigo", "juniper",
+    "kepler", "lumen", "maple", "nova", "onyx", "pixel", "quartz", "raven", "sierra", "tango",
+    "umber", "vivid", "willow", "xenon", "yonder", "zephyr"
+]
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Riley", "Casey", "Morgan", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Lee", "Patel", "Garcia", "Kim", "Nguyen", "Smith", "Okafor", "Rossi", "Novak", "Silva"]
+REPORT_REASONS = ["Spam", "Inappropriate content", "Scam attempt", "Wrong category", "Duplicate listing"]
+
+
+class BatchWriter:
+    """Buffers documents per collection and flushes them as concurrent unordered insert_many calls"""
+
+    def __init__(self, db, batch_size, parallelism):
+        self.db = db
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(parallelism)
+        self.pending = set()
+        self.buffers = {}
+        self.counts = {}
+
+    async def _insert(self, collection_name, docs):
+        try:
+            await self.db[collection_name].insert_many(docs, ordered=False)
+        finally:
+            self.semaphore.release()
+        self.counts[collection_name] = self.counts.get(collection_name, 0) + len(docs)
+
+    def _finished(self, task):
+        # Failed batches stay pending so drain() re-raises their error
+        if not task.cancelled() and task.exception() is None:
+            self.pending.discard(task)
+
+    async def add(self, collection_name, doc):
+        buffer = self.buffers.setdefault(collection_name, [])
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            await self.flush(collection_name)
+
+    async def flush(self, collection_name):
+        docs = self.buffers.get(collection_name)
+        if not docs:
+            return
+        self.buffers[collection_name] = []
+        # Waits here once `parallelism` batches are in flight
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._insert(collection_name, docs))
+        self.pending.add(task)
+        task.add_done_callback(self._finished)
+
+    async def drain(self):
+        for collection_name in list(self.buffers):
+            await self.flush(collection_name)
+        if self.pending:
+            tasks, self.pending = self.pending, set()
+            await asyncio.gather(*tasks)
+
+
+class DatasetGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc) if args.fixed_clock else datetime.now(timezone.utc)
+        self.writer = BatchWriter(server.db, args.batch_size, args.parallelism)
+        self.user_ids = []
+        self.items = []  # (item_id, owner_id, created_at)
+        self.categories = []  # (main, sub, bottom) leaves
+        self.traded_items = set()  # items taken off the market by a completed trade
+        self.trade_points = {}  # user_id -> completed trades
+        self.timings = {}
+        # Same padding for every image keeps generation cheap while matching stored size
+        self.image = "data:image/jpeg;base64," + "A" * args.image_bytes
+
+    def rng(self, stage):
+        """Independent, reproducible random stream per stage"""
+        return random.Random(f"{self.args.seed}:{stage}")
+
+    def past(self, rng, max_days):
+        """A moment within the last max_days, as the ISO string the app stores"""
+        return (self.now - timedelta(seconds=rng.random() * max_days * 86400)).isoformat()
+
+    async def timed(self, stage, coro):
+        start = time.perf_counter()
+        await coro
+        await self.writer.drain()
+        self.timings[stage] = time.perf_counter() - start
+        print(f"  {stage:12s} {self.timings[stage]:8.1f}s", file=sys.stderr)
+
+    async def gen_categories(self):
+        roots, subs, bottoms = self.args.category_shape
+        rng = self.rng("categories")
+        for r in range(roots):
+            main = f"{WORDS[r % len(WORDS)]}{r}"
+            await self.writer.add("categories", {
+                "name": main, "click_count": rng.randint(0, 10_000), "parent_category": None, "level": 0, "path": main
+            })
+            for s in range(subs):
+                sub = f"{main}x{s}"
+                await self.writer.add("categories", {
+                    "name": sub, "click_count": rng.randint(0, 2_000), "parent_category": main, "level": 1, "path": f"{main}/{sub}"
+                })
+                for b in range(bottoms):
+                    bottom = f"{sub}x{b}"
+                    await self.writer.add("categories", {
+                        "name": bottom, "click_count": rng.randint(0, 500), "parent_category": sub, "level": 2,
+                        "path": f"{main}/{sub}/{bottom}"
+                    })
+                    self.categories.append((main, sub, bottom))
+
+    async def gen_users(self):
+        rng = self.rng("users")
+        expires_at = (self.now + timedelta(days=7)).isoformat()
+        for i in range(self.args.users):
+            user_id = f"user_{i:012x}"
+            self.user_ids.append(user_id)
+            await self.writer.add("users", {
+                "user_id": user_id,
+                "email": f"{user_id}@example.com",
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "username": f"trader{i}",
+                "picture": None,
+                "trade_points": 0,
+                "rating": None,
+                "rating_count": 0,
+                "rating_sum": 0,
+                "rating_histogram": server.empty_rating_histogram(),
+                "is_admin": False,
+                "is_suspended": rng.random() < 0.002,
+                "portfolio": [],
+                "created_at": self.past(rng, self.args.days)
+            })
+            if rng.random() < self.args.session_ratio:
+                await self.writer.add("user_sessions", {
+                    "user_id": user_id,
+                    "session_token": f"sess_{i:012x}",
+                    "expires_at": expires_at,
+                    "created_at": self.now.isoformat()
+                })
+
+    async def gen_items_and_pins(self):
+        """Items with heavy-tailed pin counts; pin ages skew recent with a long tail"""
+        rng = self.rng("items")
+        pin_rng = self.rng("pins")
+        item_count = self.args.users * self.args.items_per_user
+        mean_pins = self.args.pins_per_item
+        for i in range(item_count):
+            item_id = f"item_{i:012x}"
+            owner_id = self.user_ids[rng.randrange(len(self.user_ids))]
+            main, sub, bottom = self.categories[int(rng.paretovariate(1.2)) % len(self.categories)]
+            created_at = self.past(rng, self.args.days)
+
+            # Pareto-distributed popularity, capped by the number of distinct users
+            pin_count = min(len(self.user_ids) - 1, int((rng.paretovariate(1.5) - 1) * mean_pins))
+            pins = []
+            for pinner in pin_rng.sample(self.user_ids, pin_count) if pin_count > 0 else []:
+                # Exponentially distributed ages: most pins are recent, some are months old
+                age_days = min(self.args.days, pin_rng.expovariate(1 / self.args.pin_age_days))
+                pin = {
+                    "pin_id": f"pin_{i:012x}_{len(pins)}",
+                    "user_id": pinner,
+                    "item_id": item_id,
+                    "created_at": (self.now - timedelta(days=age_days)).isoformat()
+                }
+                pins.append(pin)
+                await self.writer.add("pins", pin)
+
+            is_available = rng.random() > 0.1
+            if is_available:
+                self.items.append((item_id, owner_id, created_at))
+            await self.writer.add("items", {
+                "item_id": item_id,
+                "user_id": owner_id,
+                "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{i}",
+                "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))),
+                "image": self.image,
+                "category": main,
+                "subcategory": sub if rng.random() > 0.2 else None,
+                "bottom_category": bottom if rng.random() > 0.5 else None,
+                "is_available": is_available,
+                "boost_score": server.calculate_boost_score(pins, self.now),
+                "pin_count": len(pins),
+                "created_at": created_at
+            })
+
+    async def gen_messages(self):
+        rng = self.rng("messages")
+        for c in range(self.args.conversations):
+            a, b = rng.sample(self.user_ids, 2)
+            item_id = rng.choice(self.items)[0] if self.items and rng.random() < 0.7 else None
+            start = rng.random() * self.args.days
+            for m in range(max(1, int(rng.expovariate(1 / self.args.messages_per_conversation)))):
+                sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+                await self.writer.add("messages", {
+                    "message_id": f"msg_{c:010x}_{m}",
+                    "sender_id": sender,
+                    "receiver_id": receiver,
+                    "item_id": item_id,
+                    "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25))),
+                    "created_at": (self.now - timedelta(days=max(0.0, start - m * 0.01))).isoformat()
+                })
+
+    async def gen_trades(self):
+        rng = self.rng("trades")
+        for t in range(self.args.trades):
+            item_id, owner_id, _ = rng.choice(self.items)
+            trader_id = rng.choice(self.user_ids)
+            if trader_id == owner_id:
+                continue
+            created_at = self.now - timedelta(days=rng.random() * self.args.days)
+            # An item can only be traded away once
+            completed = rng.random() < 0.6 and item_id not in self.traded_items
+            if completed:
+                self.traded_items.add(item_id)
+                for user_id in (owner_id, trader_id):
+                    self.trade_points[user_id] = self.trade_points.get(user_id, 0) + 1
+            await self.writer.add("trades", {
+                "trade_id": f"trade_{t:012x}",
+                "item_id": item_id,
+                "owner_id": owner_id,
+                "trader_id": trader_id,
+                "owner_confirmed": completed or rng.random() < 0.3,
+                "trader_confirmed": completed or rng.random() < 0.3,
+                "is_completed": completed,
+                "owner_rating": rng.choices(range(1, 6), [1, 1, 3, 8, 12])[0] if completed and rng.random() < 0.7 else None,
+                "trader_rating": rng.choices(range(1, 6), [1, 1, 3, 8, 12])[0] if completed and rng.random() < 0.7 else None,
+                "created_at": created_at.isoformat(),
+                "completed_at": (created_at + timedelta(days=rng.random() * 5)).isoformat() if completed else None
+            })
+
+    async def apply_trade_outcomes(self):
+        """Completed trades took their item off the market and earned both parties a trade point, as confirm_trade does"""
+        batch_size = self.args.batch_size
+        item_ids = sorted(self.traded_items)
+        for i in range(0, len(item_ids), batch_size):
+            await server.db.items.update_many(
+                {"item_id": {"$in": item_ids[i:i + batch_size]}}, {"$set": {"is_available": False}}
+            )
+        points = sorted(self.trade_points.items())
+        for i in range(0, len(points), batch_size):
+            await server.db.users.bulk_write([
+                UpdateOne({"user_id": user_id}, {"$set": {"trade_points": count}})
+                for user_id, count in points[i:i + batch_size]
+            ], ordered=False)
+
+    async def gen_reports(self):
+        rng = self.rng("reports")
+        for r in range(self.args.reports):
+            report_type = rng.choice(["user", "item", "category"])
+            if report_type == "user":
+                target_id = rng.choice(self.user_ids)
+            elif report_type == "item":
+                target_id = rng.choice(self.items)[0]
+            else:
+                target_id = rng.choice(self.categories)[0]
+            await self.writer.add("reports", {
+                "report_id": f"report_{r:012x}",
+                "reporter_id": rng.choice(self.user_ids),
+                "report_type": report_type,
+                "target_id": target_id,
+                "reason": rng.choice(REPORT_REASONS),
+                "status": rng.choices(["pending", "reviewed", "resolved"], [2, 1, 5])[0],
+                "created_at": self.past(rng, self.args.days)
+            })
+
+    async def run(self):
+        if self.args.drop:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+        start = time.perf_counter()
+        print(f"Generating into {os.environ['DB_NAME']} (seed {self.args.seed})", file=sys.stderr)
+        await self.timed("categories", self.gen_categories())
+        await self.timed("users", self.gen_users())
+        await self.timed("items+pins", self.gen_items_and_pins())
+        await self.timed("messages", self.gen_messages())
+        await self.timed("trades", self.gen_trades())
+        await self.timed("outcomes", self.apply_trade_outcomes())
+        await self.timed("reports", self.gen_reports())
+
+        if not self.args.skip_derived:
+            await self.timed("ratings", server.backfill_rating_aggregates(self.args.batch_size))
+            await self.timed("counters", server.reconcile_platform_counters())
+            await self.timed("rollups", server.rebuild_daily_rollups())
+
+        total = sum(self.writer.counts.values())
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {total:,} documents in {elapsed:.1f}s ({total / elapsed:,.0f} docs/s)", file=sys.stderr)
+        for collection_name, count in sorted(self.writer.counts.items()):
+            print(f"  {collection_name:14s} {count:>12,}", file=sys.stderr)
+
+
+def category_shape(value):
+    parts = [int(part) for part in value.split("x")]
+    if len(parts) != 3 or min(parts) < 1:
+        raise argparse.ArgumentTypeError("expected ROOTSxSUBSxBOTTOMS, e.g. 12x6x5")
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a reproducible synthetic SwapFlow dataset")
+    parser.add_argument("--seed", type=int, default=1, help="random seed; same seed and sizes give the same data")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--items-per-user", type=int, default=5)
+    parser.add_argument("--pins-per-item", type=float, default=3.0, help="scale of the heavy-tailed pin count")
+    parser.add_argument("--pin-age-days", type=float, default=14.0, help="mean pin age")
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--messages-per-conversation", type=float, default=8.0, help="mean messages per conversation")
+    parser.add_argument("--trades", type=int, default=20_000)
+    parser.add_argument("--reports", type=int, default=2_000)
+    parser.add_argument("--category-shape", type=category_shape, default=[12, 6, 5], help="ROOTSxSUBSxBOTTOMS")
+    parser.add_argument("--image-bytes", type=int, default=4096, help="size of each item's base64 image payload")
+    parser.add_argument("--session-ratio", type=float, default=0.3, help="fraction of users with a live session")
+    parser.add_argument("--days", type=int, default=365, help="history length for timestamps")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per insert_many")
+    parser.add_argument("--parallelism", type=int, default=8, help="insert_many batches in flight")
+    parser.add_argument("--fixed-clock", action="store_true", help="anchor timestamps at 2026-01-01 instead of now")
+    parser.add_argument("--skip-derived", action="store_true", help="skip rating, counter and rollup rebuilds")
+    parser.add_argument("--drop", action="store_true", help="drop DB_NAME first")
+    args = parser.parse_args()
+    args.category_shape = tuple(args.category_shape)
+
+    asyncio.run(DatasetGenerator(args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Load generator for the SwapFlow API hot endpoints.
+
+Seeds a local MongoDB with a reproducible dataset, then replays a weighted mix
+of feed, item detail, pin/unpin, search, messaging and trade confirmation
+requests at a fixed concurrency. By default the app is driven in-process
+through httpx's ASGI transport; pass --base-url to target a running uvicorn
+instead. Results are printed (or written) as JSON with throughput and
+p50/p95/p99 latency per endpoint, so runs can be diffed between commits.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=swapflow_load \\
+        python load_test.py --concurrency 20 --requests 5000 --reset --output load.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_load")
+
+import httpx
+
+import server
+
+SEARCH_TERMS = ["vintage", "bike", "lamp", "book", "camera", "jacket", "guitar", "chair"]
+CATEGORY_TREE = {
+    "electronics": {"audio": ["headphones", "speakers"], "cameras": ["film", "digital"]},
+    "clothing": {"outerwear": ["jackets", "coats"], "shoes": ["sneakers", "boots"]},
+    "home": {"furniture": ["chairs", "tables"], "lighting": ["lamps", "bulbs"]}
+}
+
+# scenario -> relative weight in the request mix
+SCENARIO_WEIGHTS = {
+    "feed": 40,
+    "item_detail": 20,
+    "pin_unpin": 10,
+    "search": 10,
+    "send_message": 10,
+    "confirm_trade": 10
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadTester:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.users = []  # (user_id, session_token)
+        self.items = []  # (item_id, owner_id)
+        self.latencies = {}
+        self.errors = {}
+
+    async def seed(self):
+        """Insert users, sessions, categories and items directly into MongoDB"""
+        db = server.db
+        if self.args.reset:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+        now = datetime.now(timezone.utc)
+        categories = []
+        for main, subs in CATEGORY_TREE.items():
+            categories.append({"name": main, "click_count": 0, "parent_category": None, "level": 0, "path": main})
+            for sub, bottoms in subs.items():
+                categories.append({"name": sub, "click_count": 0, "parent_category": main, "level": 1, "path": f"{main}/{sub}"})
+                for bottom in bottoms:
+                    categories.append({"name": bottom, "click_count": 0, "parent_category": sub, "level": 2, "path": f"{main}/{sub}/{bottom}"})
+        for category in categories:
+            await db.categories.update_one({"name": category["name"]}, {"$setOnInsert": category}, upsert=True)
+
+        users, sessions = [], []
+        for i in range(self.args.users):
+            user_id = f"load_user_{self.run_id}_{i}"
+            token = f"load_session_{self.run_id}_{i}"
+            users.append({
+                "user_id": user_id,
+                "email": f"{user_id}@example.com",
+                "name": f"Load User {i}",
+                "username": f"load{self.run_id}{i}",
+                "picture": None,
+                "trade_points": 0,
+                "rating": None,
+                "rating_count": 0,
+                "rating_sum": 0,
+                "rating_histogram": server.empty_rating_histogram(),
+                "is_admin": False,
+                "portfolio": [],
+                "created_at": now.isoformat()
+            })
+            sessions.append({
+                "user_id": user_id,
+                "session_token": token,
+                "expires_at": (now + timedelta(days=1)).isoformat(),
+                "created_at": now.isoformat()
+            })
+            self.users.append((user_id, token))
+        await db.users.insert_many(users)
+        await db.user_sessions.insert_many(sessions)
+
+        items = []
+        mains = list(CATEGORY_TREE)
+        for i in range(self.args.items):
+            main = self.rng.choice(mains)
+            sub = self.rng.choice(list(CATEGORY_TREE[main]))
+            owner_id, _ = self.rng.choice(self.users)
+            item_id = f"load_item_{self.run_id}_{i}"
+            items.append({
+                "item_id": item_id,
+                "user_id": owner_id,
+                "title": f"{self.rng.choice(SEARCH_TERMS).title()} #{i}",
+                "description": f"Load test item {i} in {sub}",
+                "image": "data:image/png;base64," + "A" * self.args.image_bytes,
+                "category": main,
+                "subcategory": sub,
+                "bottom_category": self.rng.choice(CATEGORY_TREE[main][sub]),
+                "is_available": True,
+                "boost_score": round(self.rng.random() * 50, 2),
+                "pin_count": 0,
+                "created_at": (now - timedelta(minutes=i)).isoformat()
+            })
+            self.items.append((item_id, owner_id))
+        await db.items.insert_many(items)
+
+    def headers(self, token):
+        return {"Authorization": f"Bearer {token}"}
+
+    async def timed(self, http, name, method, url, token, **kwargs):
+        """Issue one request and record its latency under the endpoint name"""
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, url, headers=self.headers(token), **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    async def run_scenario(self, http, scenario):
+        user_id, token = self.rng.choice(self.users)
+        item_id, owner_id = self.rng.choice(self.items)
+
+        if scenario == "feed":
+            params = {}
+            if self.rng.random() < 0.5:
+                params["category"] = self.rng.choice(list(CATEGORY_TREE))
+            await self.timed(http, "GET /api/items", "GET", "/api/items", token, params=params)
+        elif scenario == "item_detail":
+            await self.timed(http, "GET /api/items/{item_id}", "GET", f"/api/items/{item_id}", token)
+        elif scenario == "pin_unpin":
+            await self.timed(http, "POST /api/items/{item_id}/pin", "POST", f"/api/items/{item_id}/pin", token)
+            await self.timed(http, "DELETE /api/items/{item_id}/pin", "DELETE", f"/api/items/{item_id}/pin", token)
+        elif scenario == "search":
+            await self.timed(http, "GET /api/search", "GET", "/api/search", token, params={"q": self.rng.choice(SEARCH_TERMS)})
+        elif scenario == "send_message":
+            partner_id, _ = self.rng.choice(self.users)
+            await self.timed(http, "POST /api/messages", "POST", "/api/messages", token, json={
+                "receiver_id": partner_id,
+                "item_id": item_id,
+                "content": f"Is #{item_id} still available?"
+            })
+        elif scenario == "confirm_trade":
+            # Completing a trade takes the item off the market, so use it once
+            if owner_id == user_id or len(self.items) <= 1:
+                return
+            self.items.remove((item_id, owner_id))
+            owner_token = dict(self.users)[owner_id]
+            response = await self.timed(http, "POST /api/trades", "POST", "/api/trades", token, json={
+                "item_id": item_id,
+                "owner_id": owner_id
+            })
+            if response is None or response.status_code >= 400:
+                return
+            trade_id = response.json()["trade_id"]
+            await self.timed(http, "POST /api/trades/{trade_id}/confirm", "POST", f"/api/trades/{trade_id}/confirm", token)
+            await self.timed(http, "POST /api/trades/{trade_id}/confirm", "POST", f"/api/trades/{trade_id}/confirm", owner_token)
+
+    async def worker(self, http, remaining):
+        scenarios = list(SCENARIO_WEIGHTS)
+        weights = list(SCENARIO_WEIGHTS.values())
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            await self.run_scenario(http, self.rng.choices(scenarios, weights)[0])
+
+    async def run(self):
+        await self.seed()
+
+        if self.args.base_url:
+            http = httpx.AsyncClient(base_url=self.args.base_url, timeout=60)
+            lifespan = contextlib.nullcontext()
+        else:
+            # The ASGI transport doesn't send lifespan events, so run the lifespan ourselves
+            http = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=60)
+            lifespan = server.lifespan(server.app)
+
+        async with lifespan:
+            remaining = [self.args.requests]
+            start = time.perf_counter()
+            async with http:
+                await asyncio.gather(*[self.worker(http, remaining) for _ in range(self.args.concurrency)])
+            wall_time = time.perf_counter() - start
+
+        return self.report(wall_time)
+
+    def report(self, wall_time):
+        endpoints = {}
+        total = 0
+        for name, samples in sorted(self.latencies.items()):
+            samples.sort()
+            total += len(samples)
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / wall_time, 2),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2)
+            }
+        return {
+            "config": {
+                "target": self.args.base_url or "asgi",
+                "concurrency": self.args.concurrency,
+                "scenarios": self.args.requests,
+                "users": self.args.users,
+                "items": self.args.items,
+                "seed": self.args.seed
+            },
+            "wall_time_s": round(wall_time, 3),
+            "total_requests": total,
+            "throughput_rps": round(total / wall_time, 2),
+            "endpoints": endpoints
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a realistic request mix against the SwapFlow API")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--requests", type=int, default=1000, help="number of scenarios to run in total")
+    parser.add_argument("--users", type=int, default=50, help="users to seed")
+    parser.add_argument("--items", type=int, default=1000, help="items to seed")
+    parser.add_argument("--image-bytes", type=int, default=2048, help="size of each seeded item's image payload")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and request mix")
+    parser.add_argument("--base-url", help="target a running server (e.g. http://localhost:8001) instead of in-process ASGI")
+    parser.add_argument("--reset", action="store_true", help="drop DB_NAME before seeding")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTester(args).run())
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Wrote report to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Query-count and latency budgets for SwapFlow API endpoints.
+
+Runs the app in-process through httpx's ASGI transport against a local
+MongoDB, seeds a dataset of known size, then calls each budgeted endpoint and
+checks the number of Mongo commands it issued (as counted by the server's
+command listener) and its wall time. A budget failure means an endpoint has
+regressed, e.g. get_conversations going back to one user lookup per partner.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=swapflow_budget python query_budget_test.py
+
+Exits non-zero if any budget is exceeded. DB_NAME is dropped before seeding.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "swapflow_budget")
+
+import httpx
+
+import server
+
+# Dataset size the budgets below are stated for
+PARTNERS = 30
+ITEMS = 200
+TRADES = 20
+
+# Wall time allowed per request against a local mongod
+DEFAULT_MAX_MS = 250
+
+
+class QueryBudgetTester:
+    def __init__(self):
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.failures = []
+        self.http = None
+        self.now = datetime.now(timezone.utc)
+
+    def user_doc(self, user_id, is_admin=False):
+        return {
+            "user_id": user_id,
+            "email": f"{user_id}@example.com",
+            "name": user_id.replace("_", " ").title(),
+            "username": user_id.replace("_", ""),
+            "picture": None,
+            "trade_points": 0,
+            "rating": None,
+            "rating_count": 0,
+            "rating_sum": 0,
+            "rating_histogram": server.empty_rating_histogram(),
+            "is_admin": is_admin,
+            "portfolio": [],
+            "created_at": self.now.isoformat()
+        }
+
+    def session_doc(self, user_id):
+        return {
+            "user_id": user_id,
+            "session_token": f"token_{user_id}",
+            "expires_at": (self.now + timedelta(days=1)).isoformat(),
+            "created_at": self.now.isoformat()
+        }
+
+    async def seed(self):
+        """Main user with PARTNERS conversation partners, ITEMS items and TRADES trades"""
+        db = server.db
+        await server.client.drop_database(os.environ["DB_NAME"])
+
+        user_ids = ["budget_user", "budget_admin"] + [f"partner_{i}" for i in range(PARTNERS)]
+        await db.users.insert_many([self.user_doc(uid, is_admin=(uid == "budget_admin")) for uid in user_ids])
+        await db.user_sessions.insert_many([self.session_doc(uid) for uid in user_ids])
+
+        await db.categories.insert_many([
+            {"name": "electronics", "click_count": 0, "parent_category": None, "level": 0, "path": "electronics"},
+            {"name": "audio", "click_count": 0, "parent_category": "electronics", "level": 1, "path": "electronics/audio"}
+        ])
+
+        await db.items.insert_many([
+            {
+                "item_id": f"item_{i}",
+                "user_id": "budget_user" if i % 2 == 0 else f"partner_{i % PARTNERS}",
+                "title": f"Budget item {i}",
+                "description": "Seeded for query budgets",
+                "image": "data:image/png;base64,AAAA",
+                "category": "electronics",
+                "subcategory": "audio",
+                "bottom_category": None,
+                "is_available": True,
+                "boost_score": float(i % 17),
+                "pin_count": 0,
+                "created_at": (self.now - timedelta(minutes=i)).isoformat()
+            }
+            for i in range(ITEMS)
+        ])
+
+        await db.messages.insert_many([
+            {
+                "message_id": f"msg_{i}_{n}",
+                "sender_id": "budget_user" if n % 2 == 0 else f"partner_{i}",
+                "receiver_id": f"partner_{i}" if n % 2 == 0 else "budget_user",
+                "item_id": None,
+                "content": f"Message {n}",
+                "created_at": (self.now - timedelta(minutes=n)).isoformat()
+            }
+            for i in range(PARTNERS) for n in range(3)
+        ])
+
+        await db.trades.insert_many([
+            {
+                "trade_id": f"trade_{i}",
+                "item_id": f"item_{2 * i + 1}",
+                "owner_id": f"partner_{(2 * i + 1) % PARTNERS}",
+                "trader_id": "budget_user",
+                "owner_confirmed": False,
+                "trader_confirmed": False,
+                "is_completed": False,
+                "owner_rating": None,
+                "trader_rating": None,
+                "created_at": (self.now - timedelta(hours=i)).isoformat(),
+                "completed_at": None
+            }
+            for i in range(TRADES)
+        ])
+
+    def total_db_commands(self):
+        return sum(totals["commands"] for totals in server.route_db_stats.values())
+
+    async def check(self, name, method, url, max_commands, user="budget_user", max_ms=DEFAULT_MAX_MS, **kwargs):
+        """Call an endpoint and compare its Mongo command count and wall time to the budget"""
+        self.tests_run += 1
+        before = self.total_db_commands()
+        start = time.perf_counter()
+        response = await self.http.request(method, url, headers={"Authorization": f"Bearer token_{user}"}, **kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        commands = self.total_db_commands() - before
+
+        problems = []
+        if response.status_code >= 400:
+            problems.append(f"status {response.status_code}: {response.text[:200]}")
+        if commands > max_commands:
+            problems.append(f"{commands} db commands > budget {max_commands}")
+        if elapsed_ms > max_ms:
+            problems.append(f"{elapsed_ms:.1f}ms > budget {max_ms}ms")
+
+        if problems:
+            self.failures.append((name, problems))
+            print(f"❌ {name} - " + "; ".join(problems))
+        else:
+            self.tests_passed += 1
+            print(f"✅ {name} - {commands}/{max_commands} commands, {elapsed_ms:.1f}ms")
+        return response
+
+    async def run_checks(self):
+        # Authenticated requests spend 2 commands on the session and user lookups
+        await self.check("feed", "GET", "/api/items", 1)
+        await self.check("feed by category", "GET", "/api/items", 2, params={"category": "electronics"})
+        await self.check("feed with owners", "GET", "/api/items", 2, params={"include": "owner"})
+        await self.check("user batch", "GET", "/api/users/batch", 1, params={"ids": ",".join(f"partner_{i}" for i in range(PARTNERS))})
+        await self.check("item detail", "GET", "/api/items/item_0", 2)
+        await self.check("conversations", "GET", "/api/conversations", 5)
+        await self.check("messages with partner", "GET", "/api/messages/partner_0", 4)
+        await self.check("my trades", "GET", "/api/trades", 5)
+        await self.check("search", "GET", "/api/search", 5, params={"q": "budget"})
+        await self.check("settings", "GET", "/api/settings", 1)
+        await self.check("dashboard page", "GET", "/api/pages/dashboard", 3)
+        await self.check("profile page", "GET", "/api/pages/profile/budget_user", 5)
+        await self.check("portfolio update", "PUT", "/api/users/portfolio", 4, json={"item_ids": ["item_0", "item_2", "item_4"]})
+        await self.check("create item", "POST", "/api/items", 8, json={
+            "title": "Budget post",
+            "image": "data:image/png;base64,AAAA",
+            "category": "electronics",
+            "subcategory": "audio"
+        })
+        await self.check("pin item", "POST", "/api/items/item_1/pin", 10)
+        await self.check("first trade confirmation", "POST", "/api/trades/trade_0/confirm", 3)
+        # One more than the writes it issues: commitTransaction, or the rejected attempt on a standalone mongod
+        await self.check("completing trade confirmation", "POST", "/api/trades/trade_0/confirm", 11, user="partner_1")
+        await self.check("change feed", "GET", "/api/changes", 5, params={"since": 0})
+        await self.check("admin stats", "GET", "/api/admin/stats", 3, user="budget_admin")
+
+    async def run(self):
+        await self.seed()
+        # The ASGI transport doesn't send lifespan events, so run the lifespan ourselves
+        async with server.lifespan(server.app):
+            # Startup warms the settings cache; counters still need a first reconcile
+            await server.reconcile_platform_counters()
+
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://budget") as http:
+                self.http = http
+                await self.run_checks()
+
+
+def main():
+    print("🚀 Checking query and latency budgets")
+    print(f"Dataset: {PARTNERS} partners, {ITEMS} items, {TRADES} trades")
+    print("=" * 60)
+
+    tester = QueryBudgetTester()
+    asyncio.run(tester.run())
+
+    print("=" * 60)
+    print(f"📊 Budgets met: {tester.tests_passed}/{tester.tests_run}")
+    if tester.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
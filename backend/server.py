@@ -1,25 +1,138 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, UploadFile, File, Depends
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import CursorType, ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+import bson
 import os
+import asyncio
+import contextvars
+import threading
+import json
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
 import base64
+import bisect
 import math
+import random
+import re
+import sys
+import time
+import zlib
+from collections import OrderedDict, deque
+
+# Cold start is measured from here, once the third-party imports above have loaded
+MODULE_LOADED_AT = time.perf_counter()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Per-request database accounting
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "1.0"))
+# Requests issuing the same command shape more than this many times are flagged as N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "10"))
+# Measuring bytes re-encodes every command and reply; disable if that shows up in profiles
+DB_COMMAND_BYTES = os.environ.get("DB_COMMAND_BYTES", "1") == "1"
+
+class RequestDbStats:
+    """Database work done on behalf of one HTTP request"""
+    __slots__ = ("lock", "commands", "bytes_sent", "bytes_received", "db_time", "shapes")
+    
+    def __init__(self):
+        # Motor runs commands on executor threads, so updates need a lock
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.db_time = 0.0
+        self.shapes: Dict[str, int] = {}
+
+current_db_stats: contextvars.ContextVar[Optional[RequestDbStats]] = contextvars.ContextVar("current_db_stats", default=None)
+
+# Where each command keeps its filter, for shape fingerprints
+COMMAND_FILTER_KEYS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline"
+}
+
+def query_shape(value) -> str:
+    """Structure of a query with every literal replaced by ?"""
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{key}:{query_shape(inner)}" for key, inner in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + (query_shape(value[0]) if value else "") + "]"
+    return "?"
+
+def command_shape(command_name: str, command) -> str:
+    """Fingerprint like 'find users {user_id:?}' that is equal for repeated lookups"""
+    collection = command.get(command_name)
+    if command_name == "getMore":
+        collection = command.get("collection")
+    if command_name in COMMAND_FILTER_KEYS:
+        query = command.get(COMMAND_FILTER_KEYS[command_name])
+    elif command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        query = statements[0].get("q")
+    else:
+        query = None
+    if command_name == "aggregate" and query:
+        # Every stage matters for a pipeline, not just the first element
+        shape = "[" + ",".join(query_shape(stage) for stage in query) + "]"
+    else:
+        shape = query_shape(query) if query is not None else ""
+    return f"{command_name} {collection if isinstance(collection, str) else ''} {shape}".strip()
+
+class DbCommandListener(monitoring.CommandListener):
+    """
+    Attribute Mongo commands to the request that issued them.
+    
+    Motor copies the calling context onto its executor threads, so the
+    request's RequestDbStats is visible here. Commands from background tasks
+    have no stats and are ignored.
+    """
+    def started(self, event):
+        stats = current_db_stats.get()
+        if stats is None:
+            return
+        shape = command_shape(event.command_name, event.command)
+        size = len(bson.encode(event.command)) if DB_COMMAND_BYTES else 0
+        with stats.lock:
+            stats.commands += 1
+            stats.bytes_sent += size
+            stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+    
+    def succeeded(self, event):
+        stats = current_db_stats.get()
+        if stats is None:
+            return
+        size = len(bson.encode(event.reply)) if DB_COMMAND_BYTES else 0
+        with stats.lock:
+            stats.bytes_received += size
+            stats.db_time += event.duration_micros / 1_000_000
+    
+    def failed(self, event):
+        stats = current_db_stats.get()
+        if stats is None:
+            return
+        with stats.lock:
+            stats.db_time += event.duration_micros / 1_000_000
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[DbCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 # Admin email
@@ -32,11 +145,72 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Records are queued and written by a listener thread, so log I/O never blocks the event loop
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Share of successful, fast requests to high-volume routes that get an access log line
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+HIGH_VOLUME_ROUTES = {
+    ("GET", "/api/items"),
+    ("GET", "/api/items/{item_id}"),
+    ("GET", "/api/items/{item_id}/pin-status"),
+    ("GET", "/api/settings"),
+    ("GET", "/metrics"),
+    ("GET", "/healthz"),
+    ("GET", "/readyz")
+}
+
+class RequestContext:
+    """Correlation id and authenticated user of the request being handled"""
+    __slots__ = ("request_id", "user_id")
+    
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.user_id: Optional[str] = None
+
+current_request: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("current_request", default=None)
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request's correlation id while still on the loop thread"""
+    def filter(self, record):
+        context = current_request.get()
+        record.request_id = context.request_id if context else "-"
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drop records when the queue is full instead of blocking or printing errors"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonAccessFormatter(logging.Formatter):
+    """One JSON object per access record"""
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).isoformat()
+        return json.dumps({"ts": timestamp, **record.access}, default=str)
+
+log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+log_queue_handler = DroppingQueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+log_queue_handler.addFilter(RequestIdFilter())
+
+app_log_handler = logging.StreamHandler()
+app_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+app_log_handler.addFilter(lambda record: record.name != "access")
+access_log_handler = logging.StreamHandler(sys.stdout)
+access_log_handler.setFormatter(JsonAccessFormatter())
+access_log_handler.addFilter(lambda record: record.name == "access")
+
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
+log_listener = logging.handlers.QueueListener(log_queue, app_log_handler, access_log_handler, respect_handler_level=True)
+log_listener.start()
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
 
 # ============== MODELS ==============
 
@@ -47,8 +221,10 @@ class User(BaseModel):
     username: Optional[str] = None
     picture: Optional[str] = None
     trade_points: int = 0
-    rating: Optional[float] = None
+    rating: Optional[float] = None  # Derived on read from rating_sum / rating_count
     rating_count: int = 0
+    rating_sum: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=dict)  # "1".."5" -> count
     is_admin: bool = False
     is_suspended: bool = False
     suspended_until: Optional[datetime] = None
@@ -87,6 +263,7 @@ class Category(BaseModel):
     click_count: int = 0
     parent_category: Optional[str] = None  # For subcategories
     level: int = 0  # 0=main, 1=sub, 2=bottom
+    path: Optional[str] = None  # Materialized path, e.g. "main/sub/bottom"
 
 class Message(BaseModel):
     message_id: str = Field(default_factory=lambda: f"msg_{uuid.uuid4().hex[:12]}")
@@ -171,6 +348,9 @@ class BulkDeleteItems(BaseModel):
 class BulkDeleteCategories(BaseModel):
     category_names: List[str]
 
+class MoveCategory(BaseModel):
+    parent_category: str
+
 class CategoryRequest(BaseModel):
     request_id: str = Field(default_factory=lambda: f"catreq_{uuid.uuid4().hex[:12]}")
     user_id: str
@@ -195,6 +375,14 @@ class GlobalSearch(BaseModel):
 
 # ============== AUTH HELPERS ==============
 
+def parse_utc_datetime(value) -> datetime:
+    """Parse a stored ISO string or datetime into a timezone-aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
 async def get_current_user(request: Request) -> User:
     """Get current user from session token in cookie or Authorization header"""
     session_token = request.cookies.get("session_token")
@@ -211,11 +399,7 @@ async def get_current_user(request: Request) -> User:
     if not session:
         raise HTTPException(status_code=401, detail="Invalid session")
     
-    expires_at = session["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    expires_at = parse_utc_datetime(session["expires_at"])
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
@@ -227,10 +411,7 @@ async def get_current_user(request: Request) -> User:
     if user.get("is_suspended"):
         suspended_until = user.get("suspended_until")
         if suspended_until:
-            if isinstance(suspended_until, str):
-                suspended_until = datetime.fromisoformat(suspended_until)
-            if suspended_until.tzinfo is None:
-                suspended_until = suspended_until.replace(tzinfo=timezone.utc)
+            suspended_until = parse_utc_datetime(suspended_until)
             if suspended_until > datetime.now(timezone.utc):
                 raise HTTPException(
                     status_code=403, 
@@ -238,13 +419,19 @@ async def get_current_user(request: Request) -> User:
                 )
             else:
                 # Suspension expired, auto-unsuspend
-                await db.users.update_one(
-                    {"user_id": user["user_id"]},
+                result = await db.users.update_one(
+                    {"user_id": user["user_id"], "is_suspended": True},
                     {"$set": {"is_suspended": False, "suspended_until": None, "suspension_reason": None}}
                 )
+                if result.modified_count:
+                    await bump_counters(users_suspended=-1)
                 user["is_suspended"] = False
     
-    return User(**user)
+    context = current_request.get()
+    if context is not None:
+        context.user_id = user["user_id"]
+    
+    return User(**derive_rating(user))
 
 async def get_admin_user(request: Request) -> User:
     """Get current user and verify they are admin"""
@@ -262,7 +449,7 @@ async def get_optional_user(request: Request) -> Optional[User]:
 
 # ============== BOOSTING ALGORITHM ==============
 
-def calculate_boost_score(pins: List[dict]) -> float:
+def calculate_boost_score(pins: List[dict], now: Optional[datetime] = None) -> float:
     """
     Calculate boost score based on pins with time decay.
     
@@ -280,19 +467,17 @@ def calculate_boost_score(pins: List[dict]) -> float:
     1. Recent engagement is rewarded more
     2. Consistent popularity over time still accumulates
     3. Old items don't stay boosted forever without new pins
+    
+    Pin ages are measured from `now`, the current time unless given.
     """
     BASE_POINTS = 10.0
     DECAY_RATE = 0.1
     
     total_score = 0.0
-    now = datetime.now(timezone.utc)
+    now = now or datetime.now(timezone.utc)
     
     for pin in pins:
-        pin_date = pin.get("created_at")
-        if isinstance(pin_date, str):
-            pin_date = datetime.fromisoformat(pin_date.replace('Z', '+00:00'))
-        if pin_date.tzinfo is None:
-            pin_date = pin_date.replace(tzinfo=timezone.utc)
+        pin_date = parse_utc_datetime(pin.get("created_at"))
         
         days_old = (now - pin_date).days
         decay_factor = 1 + (days_old * DECAY_RATE)
@@ -310,8 +495,853 @@ async def update_item_boost(item_id: str):
         {"item_id": item_id},
         {"$set": {"boost_score": boost_score, "pin_count": pin_count}}
     )
+    await record_changes("items", "update", [item_id])
     return boost_score
 
+async def recompute_item_boosts(item_ids: List[str], batch_size: int = 1000) -> int:
+    """Recalculate boost scores for many items with one pin read and one bulk write per batch"""
+    item_ids = list(dict.fromkeys(item_ids))
+    updated = 0
+    for start in range(0, len(item_ids), batch_size):
+        chunk = item_ids[start:start + batch_size]
+        pins_by_item = {item_id: [] for item_id in chunk}
+        async for pin in db.pins.find({"item_id": {"$in": chunk}}, {"_id": 0, "item_id": 1, "created_at": 1}):
+            pins_by_item[pin["item_id"]].append(pin)
+        
+        result = await db.items.bulk_write([
+            UpdateOne(
+                {"item_id": item_id},
+                {"$set": {"boost_score": calculate_boost_score(pins), "pin_count": len(pins)}}
+            )
+            for item_id, pins in pins_by_item.items()
+        ], ordered=False)
+        await record_changes("items", "update", chunk)
+        updated += result.modified_count
+    return updated
+
+# ============== RATING AGGREGATES ==============
+
+RATING_VALUES = range(1, 6)
+
+def empty_rating_histogram() -> Dict[str, int]:
+    """Zeroed 1-5 star histogram as stored on user documents"""
+    return {str(value): 0 for value in RATING_VALUES}
+
+def derive_rating(user: Optional[dict]) -> Optional[dict]:
+    """
+    Fill in a user's average rating from its stored aggregates.
+    
+    Ratings are stored as rating_sum / rating_count / rating_histogram and only
+    ever changed with $inc, so concurrent ratings never lose updates. The
+    average is computed here on read instead of being written back rounded.
+    Users not yet backfilled keep their legacy stored rating.
+    """
+    if user and "rating_sum" in user:
+        rating_count = user.get("rating_count") or 0
+        user["rating"] = round(user["rating_sum"] / rating_count, 1) if rating_count else None
+    return user
+
+async def backfill_rating_aggregates(batch_size: int = 500, only_missing: bool = False) -> int:
+    """
+    Rebuild user rating aggregates from the ratings stored on trades.
+    
+    Trades are the source of truth, so this is idempotent. A full rebuild
+    overwrites aggregates with a snapshot, so a rating submitted while it runs
+    can be lost; run it when ratings are quiet. only_missing writes only users
+    that still have no rating_sum, so it never overwrites an aggregate that
+    rate_trade has incremented. Updates are sent as bulk writes of at most
+    batch_size users each.
+    """
+    pipeline = [
+        {"$match": {"$or": [{"owner_rating": {"$ne": None}}, {"trader_rating": {"$ne": None}}]}},
+        # owner_rating is given by the owner to the trader and vice versa
+        {"$project": {"_id": 0, "ratings": [
+            {"user_id": "$trader_id", "rating": "$owner_rating"},
+            {"user_id": "$owner_id", "rating": "$trader_rating"}
+        ]}},
+        {"$unwind": "$ratings"},
+        {"$match": {"ratings.rating": {"$ne": None}}},
+        {"$group": {
+            "_id": {"user_id": "$ratings.user_id", "rating": "$ratings.rating"},
+            "count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "buckets": {"$push": {"rating": "$_id.rating", "count": "$count"}}
+        }}
+    ]
+    
+    updated = 0
+    batch = []
+    async for row in db.trades.aggregate(pipeline):
+        histogram = empty_rating_histogram()
+        for bucket in row["buckets"]:
+            histogram[str(bucket["rating"])] += bucket["count"]
+        rating_count = sum(histogram.values())
+        rating_sum = sum(int(value) * count for value, count in histogram.items())
+        batch.append(UpdateOne(
+            {"user_id": row["_id"], **({"rating_sum": {"$exists": False}} if only_missing else {})},
+            {"$set": {
+                "rating_sum": rating_sum,
+                "rating_count": rating_count,
+                "rating_histogram": histogram,
+                "rating": round(rating_sum / rating_count, 1)
+            }}
+        ))
+        if len(batch) >= batch_size:
+            result = await db.users.bulk_write(batch, ordered=False)
+            updated += result.modified_count
+            batch = []
+    if batch:
+        result = await db.users.bulk_write(batch, ordered=False)
+        updated += result.modified_count
+    
+    # Users who have never been rated get zeroed aggregates; everyone rated already has a rating_sum
+    result = await db.users.update_many(
+        {"rating_sum": {"$exists": False}},
+        {"$set": {
+            "rating_sum": 0,
+            "rating_count": 0,
+            "rating_histogram": empty_rating_histogram(),
+            "rating": None
+        }}
+    )
+    updated += result.modified_count
+    
+    return updated
+
+# ============== USER SUMMARIES ==============
+
+# Public fields shown next to items and in conversation lists, plus what derive_rating needs
+USER_SUMMARY_FIELDS = ["user_id", "name", "username", "picture", "rating", "trade_points"]
+USER_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in USER_SUMMARY_FIELDS}, "rating_sum": 1, "rating_count": 1}
+USER_BATCH_MAX = 100
+
+async def get_user_summaries(user_ids) -> Dict[str, dict]:
+    """Compact public profiles by user_id, fetched with one $in query"""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    users = await db.users.find({"user_id": {"$in": user_ids}}, USER_SUMMARY_PROJECTION).to_list(None)
+    return {
+        user["user_id"]: {field: derive_rating(user).get(field) for field in USER_SUMMARY_FIELDS}
+        for user in users
+    }
+
+# ============== SETTINGS CACHE ==============
+
+SETTINGS_CACHE_SECONDS = 60
+
+# generation is bumped by every invalidation, so a read that raced one isn't cached
+settings_cache = {"value": None, "loaded_at": 0.0, "generation": 0}
+
+async def get_cached_settings() -> dict:
+    """Global settings, served from process memory for up to SETTINGS_CACHE_SECONDS"""
+    value = settings_cache["value"]
+    if value is None or time.monotonic() - settings_cache["loaded_at"] > SETTINGS_CACHE_SECONDS:
+        generation = settings_cache["generation"]
+        settings = await db.settings.find_one({"setting_id": "global_settings"}, {"_id": 0})
+        value = settings or Settings().model_dump()
+        if settings_cache["generation"] == generation:
+            settings_cache["value"] = value
+            settings_cache["loaded_at"] = time.monotonic()
+    return dict(value)
+
+def invalidate_settings_cache():
+    """Force the next settings read to go to the database, on every worker"""
+    apply_cache_invalidation("settings")
+    broadcast_cache_invalidation("settings")
+
+# ============== SEARCH CACHE ==============
+
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "512"))
+# Bounds staleness of fields no write invalidates, like user names and pin counts
+SEARCH_CACHE_SECONDS = float(os.environ.get("SEARCH_CACHE_SECONDS", "30"))
+
+# (normalized query, type) -> (version, stored_at, results), least recently used first
+search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+search_cache_state = {"version": 0}
+search_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def normalize_search_query(q: str) -> str:
+    """Case and whitespace variants of a query share one cache entry"""
+    return " ".join(q.lower().split())
+
+def get_cached_search(key: tuple) -> Optional[dict]:
+    """Cached results for a search if they are fresh and no item/category write happened since"""
+    entry = search_cache.get(key)
+    if entry is not None:
+        version, stored_at, results = entry
+        if version == search_cache_state["version"] and time.monotonic() - stored_at <= SEARCH_CACHE_SECONDS:
+            search_cache.move_to_end(key)
+            search_cache_stats["hits"] += 1
+            return results
+        del search_cache[key]
+    search_cache_stats["misses"] += 1
+    return None
+
+def store_cached_search(key: tuple, results: dict, version: int):
+    """Cache results read at the given search_cache_state version; a write since then makes them stale at once"""
+    search_cache[key] = (version, time.monotonic(), results)
+    search_cache.move_to_end(key)
+    while len(search_cache) > SEARCH_CACHE_SIZE:
+        search_cache.popitem(last=False)
+        search_cache_stats["evictions"] += 1
+
+def invalidate_search_cache():
+    """Make every cached search stale on every worker; call after item or category writes"""
+    apply_cache_invalidation("search")
+    broadcast_cache_invalidation("search")
+
+# ============== CATEGORY TREE ==============
+
+CATEGORY_TREE_SECONDS = 300
+
+# generation is bumped by every invalidation, so a load that raced one isn't cached
+category_tree_cache = {"nodes": None, "loaded_at": 0.0, "generation": 0}
+category_tree_lock = asyncio.Lock()
+
+def build_category_tree(categories: List[dict]) -> dict:
+    """
+    Index categories by name with parent, level, children and materialized path.
+    
+    A category is a child of its parent_category only when it sits exactly one
+    level below it, mirroring the rules create_item validates against.
+    Children are ordered by click count, most popular first.
+    """
+    nodes = {
+        cat["name"]: {
+            "name": cat["name"],
+            "parent_category": cat.get("parent_category"),
+            "level": cat.get("level"),
+            "click_count": cat.get("click_count", 0),
+            "children": [],
+            "path": cat["name"]
+        }
+        for cat in categories
+    }
+    
+    for node in sorted(nodes.values(), key=lambda n: n["click_count"], reverse=True):
+        parent = nodes.get(node["parent_category"]) if node["parent_category"] else None
+        if parent and parent["level"] is not None and node["level"] == parent["level"] + 1:
+            parent["children"].append(node["name"])
+    
+    for node in nodes.values():
+        names = [node["name"]]
+        parent = nodes.get(node["parent_category"]) if node["parent_category"] else None
+        while parent and parent["name"] not in names and len(names) <= 3:
+            names.append(parent["name"])
+            parent = nodes.get(parent["parent_category"]) if parent["parent_category"] else None
+        node["path"] = "/".join(reversed(names))
+    
+    return nodes
+
+async def get_category_tree() -> dict:
+    """Category nodes by name, loaded once and reused until invalidated or stale"""
+    nodes = category_tree_cache["nodes"]
+    if nodes is None or time.monotonic() - category_tree_cache["loaded_at"] > CATEGORY_TREE_SECONDS:
+        async with category_tree_lock:
+            # Another request may have reloaded it while we waited
+            nodes = category_tree_cache["nodes"]
+            if nodes is None or time.monotonic() - category_tree_cache["loaded_at"] > CATEGORY_TREE_SECONDS:
+                generation = category_tree_cache["generation"]
+                categories = await db.categories.find({}, {"_id": 0}).to_list(None)
+                nodes = build_category_tree(categories)
+                if category_tree_cache["generation"] == generation:
+                    category_tree_cache["nodes"] = nodes
+                    category_tree_cache["loaded_at"] = time.monotonic()
+    return nodes
+
+def invalidate_category_tree():
+    """Drop the category tree on every worker so the next read reloads it; call after category writes"""
+    apply_cache_invalidation("category_tree")
+    broadcast_cache_invalidation("category_tree")
+
+# Item field holding the category name at each level
+CATEGORY_LEVEL_FIELDS = ["category", "subcategory", "bottom_category"]
+
+def category_child_path(parent_cat: Optional[dict], name: str) -> str:
+    """Materialized path for a category created under parent_cat"""
+    if not parent_cat:
+        return name
+    return f"{parent_cat.get('path') or parent_cat['name']}/{name}"
+
+def category_subtree_query(paths: List[str]) -> dict:
+    """Filter for the categories at the given paths and all their descendants (uses the path index)"""
+    return {"$or": [{"path": {"$in": paths}}] + [
+        {"path": {"$regex": f"^{re.escape(path)}/"}} for path in paths
+    ]}
+
+async def backfill_category_paths() -> int:
+    """Store materialized paths on categories created before paths existed"""
+    if not await db.categories.count_documents({"path": {"$exists": False}}, limit=1):
+        return 0
+    
+    categories = await db.categories.find({}, {"_id": 0}).to_list(None)
+    nodes = build_category_tree(categories)
+    result = await db.categories.bulk_write([
+        UpdateOne({"name": name, "path": {"$exists": False}}, {"$set": {"path": node["path"]}})
+        for name, node in nodes.items()
+    ], ordered=False)
+    invalidate_category_tree()
+    invalidate_search_cache()
+    await record_changes("categories", "update", list(nodes))
+    return result.modified_count
+
+def category_subtree(nodes: dict, name: str) -> dict:
+    """Nested, JSON-ready view of a node and its descendants"""
+    node = nodes[name]
+    return {
+        "name": node["name"],
+        "parent_category": node["parent_category"],
+        "level": node["level"],
+        "click_count": node["click_count"],
+        "path": node["path"],
+        "children": [category_subtree(nodes, child) for child in node["children"]]
+    }
+
+# ============== CACHE COHERENCE ==============
+
+# Invalidations are broadcast through a small capped collection that every worker tails,
+# so a write on one uvicorn worker clears the in-process caches of all of them
+CACHE_BROADCAST = os.environ.get("CACHE_BROADCAST", "1") == "1"
+CACHE_BROADCAST_BYTES = 1024 * 1024
+CACHE_BROADCAST_MAX = 10000
+# How long a tailing read waits for new events; bounds how late other workers apply them
+CACHE_BROADCAST_AWAIT_MS = 500
+CACHE_BROADCAST_RETRY_SECONDS = 1.0
+CACHE_NAMES = ("settings", "category_tree", "search")
+
+WORKER_ID = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+pending_cache_invalidations = set()
+cache_invalidations_pending = asyncio.Event()
+cache_coherence_stats = {"published": 0, "applied": 0, "resyncs": 0}
+
+def apply_cache_invalidation(cache: str):
+    """Drop one of this worker's caches"""
+    if cache == "settings":
+        settings_cache["value"] = None
+        settings_cache["generation"] += 1
+    elif cache == "category_tree":
+        category_tree_cache["nodes"] = None
+        category_tree_cache["generation"] += 1
+    elif cache == "search":
+        search_cache_state["version"] += 1
+
+def broadcast_cache_invalidation(cache: str):
+    """Queue an invalidation for the other workers; published by publish_cache_invalidations"""
+    if CACHE_BROADCAST:
+        pending_cache_invalidations.add(cache)
+        cache_invalidations_pending.set()
+
+async def ensure_cache_invalidation_log():
+    """Create the capped broadcast collection, seeded so tailable cursors have a position"""
+    try:
+        await db.create_collection("cache_invalidations", capped=True, size=CACHE_BROADCAST_BYTES, max=CACHE_BROADCAST_MAX)
+        await db.cache_invalidations.insert_one({"cache": None, "origin": WORKER_ID, "at": datetime.now(timezone.utc).isoformat()})
+    except CollectionInvalid:
+        pass  # already exists, possibly created by another worker
+
+async def publish_cache_invalidations():
+    """Write queued invalidations, coalescing bursts of writes into one insert"""
+    while True:
+        await cache_invalidations_pending.wait()
+        cache_invalidations_pending.clear()
+        caches = sorted(pending_cache_invalidations)
+        pending_cache_invalidations.clear()
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            await db.cache_invalidations.insert_many([
+                {"cache": cache, "origin": WORKER_ID, "at": now} for cache in caches
+            ])
+            cache_coherence_stats["published"] += len(caches)
+        except Exception:
+            logger.exception("Publishing cache invalidations failed; retrying")
+            pending_cache_invalidations.update(caches)
+            await asyncio.sleep(CACHE_BROADCAST_RETRY_SECONDS)
+            cache_invalidations_pending.set()
+
+async def follow_cache_invalidations():
+    """
+    Tail the broadcast collection and apply other workers' invalidations.
+    
+    Events already retained when tailing starts predate this worker's caches,
+    so they are skipped up to the newest one read beforehand. The cursor
+    still starts at the oldest retained event: a tailable cursor whose first
+    batch is empty may be dead, and ObjectIds from different processes aren't
+    strictly ordered, so filtering on _id could miss events. If the cursor is
+    lost (e.g. the capped collection wrapped past it) events may have been
+    missed, so every cache is dropped before tailing resumes.
+    """
+    resync = False
+    while True:
+        try:
+            newest = await db.cache_invalidations.find({}, {"_id": 1}).sort("$natural", -1).limit(1).to_list(1)
+            skip_until = newest[0]["_id"] if newest else None
+            if resync:
+                for cache in CACHE_NAMES:
+                    apply_cache_invalidation(cache)
+                cache_coherence_stats["resyncs"] += 1
+            cursor = db.cache_invalidations.find(
+                {}, cursor_type=CursorType.TAILABLE_AWAIT
+            ).max_await_time_ms(CACHE_BROADCAST_AWAIT_MS)
+            while cursor.alive:
+                async for event in cursor:
+                    if skip_until is not None:
+                        if event["_id"] == skip_until:
+                            skip_until = None
+                        continue
+                    if event.get("origin") != WORKER_ID and event.get("cache") in CACHE_NAMES:
+                        apply_cache_invalidation(event["cache"])
+                        cache_coherence_stats["applied"] += 1
+        except Exception:
+            logger.exception("Following cache invalidations failed")
+        resync = True
+        await asyncio.sleep(CACHE_BROADCAST_RETRY_SECONDS)
+
+# ============== PLATFORM COUNTERS ==============
+
+PLATFORM_COUNTERS_ID = "platform"
+COUNTER_RECONCILE_SECONDS = int(os.environ.get("COUNTER_RECONCILE_SECONDS", "900"))
+
+# counter field -> (collection, filter) used to recount it from scratch
+PLATFORM_COUNTER_QUERIES = {
+    "users_total": ("users", {}),
+    "users_suspended": ("users", {"is_suspended": True}),
+    "items_total": ("items", {}),
+    "items_available": ("items", {"is_available": True}),
+    "trades_total": ("trades", {}),
+    "trades_completed": ("trades", {"is_completed": True}),
+    "reports_pending": ("reports", {"status": "pending"}),
+    "categories_total": ("categories", {})
+}
+
+async def bump_counters(**deltas: int):
+    """Apply deltas to the platform counters document with a single $inc"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    await db.counters.update_one(
+        {"counter_id": PLATFORM_COUNTERS_ID},
+        {"$inc": deltas},
+        upsert=True
+    )
+
+def deleted_counter_deltas(collection_name: str, docs: List[dict]) -> dict:
+    """Counter deltas caused by deleting docs from a collection"""
+    if collection_name == "users":
+        return {
+            "users_total": -len(docs),
+            "users_suspended": -sum(1 for doc in docs if doc.get("is_suspended"))
+        }
+    if collection_name == "items":
+        return {
+            "items_total": -len(docs),
+            "items_available": -sum(1 for doc in docs if doc.get("is_available"))
+        }
+    if collection_name == "trades":
+        return {
+            "trades_total": -len(docs),
+            "trades_completed": -sum(1 for doc in docs if doc.get("is_completed"))
+        }
+    if collection_name == "reports":
+        return {"reports_pending": -sum(1 for doc in docs if doc.get("status") == "pending")}
+    if collection_name == "categories":
+        return {"categories_total": -len(docs)}
+    return {}
+
+async def reconcile_platform_counters() -> dict:
+    """Recount every platform counter from the source collections, correcting drift"""
+    fields = list(PLATFORM_COUNTER_QUERIES)
+    counts = await asyncio.gather(*[
+        db[collection_name].count_documents(query)
+        for collection_name, query in PLATFORM_COUNTER_QUERIES.values()
+    ])
+    counters = dict(zip(fields, counts))
+    counters["reconciled_at"] = datetime.now(timezone.utc).isoformat()
+    
+    await db.counters.update_one(
+        {"counter_id": PLATFORM_COUNTERS_ID},
+        {"$set": counters},
+        upsert=True
+    )
+    return counters
+
+async def counter_reconciliation_loop():
+    """Periodically reconcile platform counters"""
+    while True:
+        try:
+            await reconcile_platform_counters()
+        except Exception:
+            logger.exception("Platform counter reconciliation failed")
+        await asyncio.sleep(COUNTER_RECONCILE_SECONDS)
+
+# ============== CHANGE LOG ==============
+
+# Capped collection of sequenced item/category mutations; the oldest entries fall off first
+CHANGE_LOG_BYTES = int(os.environ.get("CHANGE_LOG_BYTES", str(64 * 1024 * 1024)))
+CHANGE_LOG_MAX = int(os.environ.get("CHANGE_LOG_MAX", "200000"))
+CHANGE_SEQUENCE_ID = "change_seq"
+CHANGES_PAGE_MAX = 500
+# A sequence gap younger than this may be a write still in flight, so paging stops before it
+CHANGE_SETTLE_SECONDS = 5
+
+async def ensure_change_log():
+    """Create the capped changes collection and its sequence index if missing"""
+    try:
+        await db.create_collection("changes", capped=True, size=CHANGE_LOG_BYTES, max=CHANGE_LOG_MAX)
+    except CollectionInvalid:
+        pass  # already exists, possibly created by another worker
+    await db.changes.create_index("seq", unique=True)
+
+async def record_changes(collection_name: str, op: str, keys):
+    """
+    Append one change per key with consecutive sequence numbers.
+    
+    Only the key is logged; /api/changes resolves current documents when read,
+    so a change costs one counter bump and one insert regardless of doc size.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    counter = await db.counters.find_one_and_update(
+        {"counter_id": CHANGE_SEQUENCE_ID},
+        {"$inc": {"seq": len(keys)}},
+        projection={"_id": 0, "seq": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first_seq = counter["seq"] - len(keys) + 1
+    now = datetime.now(timezone.utc).isoformat()
+    await db.changes.insert_many([
+        {"seq": first_seq + offset, "collection": collection_name, "op": op, "key": key, "recorded_at": now}
+        for offset, key in enumerate(keys)
+    ], ordered=False)
+
+# ============== DAILY ROLLUPS ==============
+
+ROLLUP_MAX_DAYS = 366
+
+# rollup metric -> (collection, date field) used to rebuild it from scratch
+DAILY_ROLLUP_SOURCES = {
+    "new_users": ("users", "created_at"),
+    "items_posted": ("items", "created_at"),
+    "pins": ("pins", "created_at"),
+    "trades_opened": ("trades", "created_at"),
+    "trades_completed": ("trades", "completed_at"),
+    "reports_filed": ("reports", "created_at")
+}
+
+def rollup_day(moment: Optional[datetime] = None) -> str:
+    """UTC day bucket key (YYYY-MM-DD) for a moment, defaulting to now"""
+    return (moment or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+async def bump_daily_rollup(**deltas: int):
+    """Increment today's rollup bucket with a single upserted $inc"""
+    await db.daily_rollups.update_one(
+        {"day": rollup_day()},
+        {"$inc": deltas},
+        upsert=True
+    )
+
+async def rebuild_daily_rollups() -> int:
+    """Recompute every daily bucket from the source collections"""
+    buckets = {}
+    for metric, (collection_name, field) in DAILY_ROLLUP_SOURCES.items():
+        # Dates are stored both as ISO strings and as BSON dates
+        day_expr = {"$cond": [
+            {"$eq": [{"$type": f"${field}"}, "date"]},
+            {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}},
+            {"$substrBytes": [f"${field}", 0, 10]}
+        ]}
+        pipeline = [
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": day_expr, "count": {"$sum": 1}}}
+        ]
+        async for row in db[collection_name].aggregate(pipeline):
+            buckets.setdefault(row["_id"], dict.fromkeys(DAILY_ROLLUP_SOURCES, 0))[metric] = row["count"]
+    
+    if buckets:
+        await db.daily_rollups.bulk_write([
+            UpdateOne({"day": day}, {"$set": metrics}, upsert=True)
+            for day, metrics in buckets.items()
+        ], ordered=False)
+    return len(buckets)
+
+# ============== BACKGROUND ACCOUNT DELETION ==============
+
+DELETION_BATCH_SIZE = 1000
+# A running job whose worker hasn't renewed its lease for this long is taken over by another worker
+DELETION_LEASE_SECONDS = int(os.environ.get("DELETION_LEASE_SECONDS", "300"))
+# Fields needed to recompute boosts and adjust platform counters for a deleted batch
+DELETION_BATCH_PROJECTION = {"_id": 1, "item_id": 1, "is_available": 1, "is_completed": 1, "status": 1, "is_suspended": 1}
+
+# job_ids waiting for the deletion worker; the job documents are the durable queue
+deletion_queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+def account_deletion_steps(user_id: str) -> List[tuple]:
+    """Collections and filters to clear when a user is deleted, in order"""
+    return [
+        ("items", {"user_id": user_id}),
+        ("messages", {"$or": [{"sender_id": user_id}, {"receiver_id": user_id}]}),
+        ("message_buckets", {"participants": user_id}),
+        ("trades", {"$or": [{"owner_id": user_id}, {"trader_id": user_id}]}),
+        ("pins", {"user_id": user_id}),
+        ("user_sessions", {"user_id": user_id}),
+        ("reports", {"reporter_id": user_id}),
+        ("users", {"user_id": user_id})
+    ]
+
+async def enqueue_account_deletion(user_id: str, requested_by: str) -> dict:
+    """Record a deletion job, lock the account out and hand the job to the worker"""
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "job_id": f"deljob_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "requested_by": requested_by,
+        "status": "queued",
+        "current_step": None,
+        "progress": {collection_name: 0 for collection_name, _ in account_deletion_steps(user_id)},
+        "item_pins_deleted": 0,
+        "boosts_recomputed": 0,
+        "error": None,
+        "worker": None,
+        "lease_expires_at": None,
+        "created_at": now,
+        "started_at": None,
+        "completed_at": None
+    }
+    await db.deletion_jobs.insert_one(job.copy())
+    
+    # Sessions go first so the account stops working before the job runs
+    await db.user_sessions.delete_many({"user_id": user_id})
+    
+    deletion_queue.put_nowait(job["job_id"])
+    return job
+
+def deletion_lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=DELETION_LEASE_SECONDS)).isoformat()
+
+def claimable_deletion_jobs_query() -> dict:
+    """Jobs no worker holds: still queued, or running under a lease that has run out"""
+    return {"$or": [
+        {"status": "queued"},
+        {"status": "running", "$or": [
+            {"lease_expires_at": None},
+            {"lease_expires_at": {"$lt": datetime.now(timezone.utc).isoformat()}}
+        ]}
+    ]}
+
+async def run_account_deletion(job_id: str):
+    """Delete everything belonging to a user in bounded batches, tracking progress on the job"""
+    # Every worker requeues unfinished jobs on startup, so only the one that claims a job runs it
+    job = await db.deletion_jobs.find_one_and_update(
+        {"job_id": job_id, **claimable_deletion_jobs_query()},
+        {"$set": {
+            "status": "running",
+            "worker": WORKER_ID,
+            "lease_expires_at": deletion_lease_expiry(),
+            "started_at": datetime.now(timezone.utc).isoformat()
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return
+    owned = {"job_id": job_id, "worker": WORKER_ID}
+    
+    try:
+        for collection_name, query in account_deletion_steps(job["user_id"]):
+            collection = db[collection_name]
+            while True:
+                batch = await collection.find(query, DELETION_BATCH_PROJECTION).limit(DELETION_BATCH_SIZE).to_list(DELETION_BATCH_SIZE)
+                if not batch:
+                    break
+                progress = {}
+                
+                # Other users' pins on the items go first, so none outlives its item if the job stops mid-batch
+                if collection_name == "items":
+                    pins_result = await db.pins.delete_many({"item_id": {"$in": [doc["item_id"] for doc in batch]}})
+                    progress["item_pins_deleted"] = pins_result.deleted_count
+                
+                result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                await bump_counters(**deleted_counter_deltas(collection_name, batch))
+                if collection_name == "items":
+                    invalidate_search_cache()
+                    await record_changes("items", "delete", [doc["item_id"] for doc in batch])
+                progress[f"progress.{collection_name}"] = result.deleted_count
+                
+                # Items the user had pinned lose those pins' boost
+                if collection_name == "pins":
+                    progress["boosts_recomputed"] = await recompute_item_boosts([doc["item_id"] for doc in batch])
+                
+                renewed = await db.deletion_jobs.update_one(
+                    owned,
+                    {"$set": {"current_step": collection_name, "lease_expires_at": deletion_lease_expiry()}, "$inc": progress}
+                )
+                if renewed.matched_count == 0:
+                    logger.warning(f"Account deletion job {job_id} was taken over by another worker")
+                    return
+        
+        await db.deletion_jobs.update_one(
+            owned,
+            {"$set": {
+                "status": "completed",
+                "current_step": None,
+                "lease_expires_at": None,
+                "completed_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+    except Exception as e:
+        logger.exception(f"Account deletion job {job_id} failed")
+        await db.deletion_jobs.update_one(
+            owned,
+            {"$set": {"status": "failed", "lease_expires_at": None, "error": str(e)}}
+        )
+
+async def account_deletion_worker():
+    """Process queued deletion jobs one at a time so they never compete with each other"""
+    while True:
+        try:
+            job_id = await asyncio.wait_for(deletion_queue.get(), DELETION_LEASE_SECONDS)
+        except asyncio.TimeoutError:
+            # Idle: pick up jobs whose worker died without finishing them
+            await resume_deletion_jobs()
+            continue
+        try:
+            await run_account_deletion(job_id)
+        finally:
+            deletion_queue.task_done()
+
+# ============== MESSAGE ARCHIVE ==============
+
+# Messages from before this many days ago move out of `messages` into per-conversation, per-day buckets
+MESSAGE_ARCHIVE_DAYS = int(os.environ.get("MESSAGE_ARCHIVE_DAYS", "90"))
+MESSAGE_ARCHIVE_COMPRESS = os.environ.get("MESSAGE_ARCHIVE_COMPRESS", "1") == "1"
+MESSAGE_ARCHIVE_INTERVAL = int(os.environ.get("MESSAGE_ARCHIVE_INTERVAL", "3600"))
+MESSAGE_ARCHIVE_BATCH_SIZE = 5000
+MESSAGE_PAGE_MAX = 200
+ARCHIVED_MESSAGE_FIELDS = ["message_id", "sender_id", "receiver_id", "item_id", "content", "created_at"]
+
+def conversation_key(user_a: str, user_b: str) -> str:
+    """Order-independent id for the conversation between two users"""
+    return "|".join(sorted([user_a, user_b]))
+
+def encode_bucket_messages(messages: List[dict]) -> dict:
+    """Bucket fields holding its messages, as zlib-compressed JSON when enabled"""
+    if MESSAGE_ARCHIVE_COMPRESS:
+        return {"compressed": True, "messages": None, "data": bson.Binary(zlib.compress(json.dumps(messages).encode()))}
+    return {"compressed": False, "messages": messages, "data": None}
+
+def decode_bucket_messages(bucket: dict) -> List[dict]:
+    """A bucket's messages, oldest first"""
+    if bucket.get("compressed"):
+        return json.loads(zlib.decompress(bucket["data"]))
+    return bucket.get("messages") or []
+
+async def compact_messages(older_than_days: int = MESSAGE_ARCHIVE_DAYS, batch_size: int = MESSAGE_ARCHIVE_BATCH_SIZE) -> dict:
+    """
+    Move messages from whole days before the cutoff into message_buckets.
+    
+    Buckets are written before the hot copies are deleted and merged by
+    message_id, so rerunning after an interruption is safe.
+    """
+    cutoff_day = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).date()
+    cutoff = datetime.combine(cutoff_day, datetime.min.time(), tzinfo=timezone.utc).isoformat()
+    projection = {"_id": 0, **{field: 1 for field in ARCHIVED_MESSAGE_FIELDS}}
+    moved = buckets_written = 0
+    
+    while True:
+        batch = await db.messages.find(
+            {"created_at": {"$lt": cutoff}}, projection
+        ).sort("created_at", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        groups: Dict[str, List[dict]] = {}
+        for message in batch:
+            key = conversation_key(message["sender_id"], message["receiver_id"])
+            groups.setdefault(f"{key}:{message['created_at'][:10]}", []).append(message)
+        
+        existing = await db.message_buckets.find({"bucket_id": {"$in": list(groups)}}, {"_id": 0}).to_list(None)
+        existing_by_id = {bucket["bucket_id"]: bucket for bucket in existing}
+        
+        operations = []
+        for bucket_id, messages in groups.items():
+            key, day = bucket_id.rsplit(":", 1)
+            merged = {m["message_id"]: m for m in decode_bucket_messages(existing_by_id.get(bucket_id, {}))}
+            merged.update({m["message_id"]: m for m in messages})
+            ordered = sorted(merged.values(), key=lambda m: m["created_at"])
+            last = ordered[-1]
+            operations.append(ReplaceOne({"bucket_id": bucket_id}, {
+                "bucket_id": bucket_id,
+                "conversation": key,
+                "participants": key.split("|"),
+                "day": day,
+                "count": len(ordered),
+                "first_at": ordered[0]["created_at"],
+                "last_at": last["created_at"],
+                "last_message": {field: last.get(field) for field in ("sender_id", "receiver_id", "item_id", "content", "created_at")},
+                **encode_bucket_messages(ordered)
+            }, upsert=True))
+        await db.message_buckets.bulk_write(operations, ordered=False)
+        
+        result = await db.messages.delete_many({"message_id": {"$in": [m["message_id"] for m in batch]}})
+        moved += result.deleted_count
+        buckets_written += len(operations)
+        if result.deleted_count == 0:
+            break
+    
+    return {"cutoff": cutoff, "messages_moved": moved, "buckets_written": buckets_written}
+
+async def read_conversation_history(user_id: str, partner_id: str, before: Optional[str], limit: int) -> List[dict]:
+    """
+    The newest `limit` messages sent before `before`, oldest first.
+    
+    Archived messages are always older than hot ones, so hot storage is read
+    first and buckets only when the page isn't full yet.
+    """
+    query = {"$or": [
+        {"sender_id": user_id, "receiver_id": partner_id},
+        {"sender_id": partner_id, "receiver_id": user_id}
+    ]}
+    if before:
+        query["created_at"] = {"$lt": before}
+    messages = await db.messages.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    
+    if len(messages) < limit:
+        # A message can sit in both places while compaction is mid-batch
+        seen = {message["message_id"] for message in messages}
+        bucket_query = {"conversation": conversation_key(user_id, partner_id)}
+        if before:
+            bucket_query["day"] = {"$lte": before[:10]}
+        cursor = db.message_buckets.find(bucket_query, {"_id": 0}).sort("day", -1)
+        async for bucket in cursor:
+            for message in reversed(decode_bucket_messages(bucket)):
+                if message["message_id"] in seen or (before and message["created_at"] >= before):
+                    continue
+                messages.append(message)
+                seen.add(message["message_id"])
+                if len(messages) >= limit:
+                    break
+            if len(messages) >= limit:
+                break
+        await cursor.close()
+    
+    messages.reverse()
+    return messages
+
+async def message_archive_loop():
+    """Periodically compact old messages into buckets"""
+    while True:
+        try:
+            result = await compact_messages()
+            if result["messages_moved"]:
+                logger.info(f"Archived {result['messages_moved']} messages into {result['buckets_written']} buckets")
+        except Exception:
+            logger.exception("Message compaction failed")
+        await asyncio.sleep(MESSAGE_ARCHIVE_INTERVAL)
+
 # ============== AUTH ENDPOINTS ==============
 
 @api_router.post("/auth/session")
@@ -362,11 +1392,14 @@ async def create_session(request: Request, response: Response):
             "trade_points": 0,
             "rating": None,
             "rating_count": 0,
+            "rating_sum": 0,
+            "rating_histogram": empty_rating_histogram(),
             "is_admin": is_admin,
             "portfolio": [],
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.users.insert_one(new_user.copy())
+        await asyncio.gather(bump_counters(users_total=1), bump_daily_rollup(new_users=1))
     
     # Create session
     session_token = auth_data.get("session_token", f"sess_{uuid.uuid4().hex}")
@@ -394,7 +1427,7 @@ async def create_session(request: Request, response: Response):
     # Get user data
     user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     
-    return {"user": user, "session_token": session_token}
+    return {"user": derive_rating(user), "session_token": session_token}
 
 @api_router.get("/auth/me")
 async def get_me(user: User = Depends(get_current_user)):
@@ -413,13 +1446,22 @@ async def logout(request: Request, response: Response):
 
 # ============== USER ENDPOINTS ==============
 
+@api_router.get("/users/batch")
+async def get_users_batch(ids: str):
+    """Get public summaries for a comma-separated list of user IDs, skipping unknown ones"""
+    user_ids = [user_id for user_id in dict.fromkeys(ids.split(",")) if user_id]
+    if len(user_ids) > USER_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {USER_BATCH_MAX} ids per request")
+    summaries = await get_user_summaries(user_ids)
+    return [summaries[user_id] for user_id in user_ids if user_id in summaries]
+
 @api_router.get("/users/{user_id}")
 async def get_user(user_id: str):
     """Get user profile by ID"""
     user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return derive_rating(user)
 
 @api_router.put("/users/profile")
 async def update_profile(update: UserUpdate, user: User = Depends(get_current_user)):
@@ -444,51 +1486,57 @@ async def update_profile(update: UserUpdate, user: User = Depends(get_current_us
         )
     
     updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0})
-    return updated_user
+    return derive_rating(updated_user)
 
 @api_router.delete("/users/account")
 async def delete_account(user: User = Depends(get_current_user)):
-    """Delete current user's account and all their data"""
-    # Delete user's items
-    await db.items.delete_many({"user_id": user.user_id})
-    # Delete user's messages
-    await db.messages.delete_many({"$or": [{"sender_id": user.user_id}, {"receiver_id": user.user_id}]})
-    # Delete user's trades
-    await db.trades.delete_many({"$or": [{"owner_id": user.user_id}, {"trader_id": user.user_id}]})
-    # Delete user's pins
-    await db.pins.delete_many({"user_id": user.user_id})
-    # Delete user's sessions
-    await db.user_sessions.delete_many({"user_id": user.user_id})
-    # Delete user's reports
-    await db.reports.delete_many({"reporter_id": user.user_id})
-    # Delete user
-    await db.users.delete_one({"user_id": user.user_id})
-    
-    return {"message": "Account deleted successfully"}
+    """Delete current user's account; their data is removed by a background job"""
+    job = await enqueue_account_deletion(user.user_id, requested_by=user.user_id)
+    
+    return {"message": "Account deletion started", "job_id": job["job_id"], "status": job["status"]}
+
+@api_router.get("/deletion-jobs/{job_id}")
+async def get_deletion_job(job_id: str, user: Optional[User] = Depends(get_optional_user)):
+    """Get the status of an account deletion job"""
+    job = await db.deletion_jobs.find_one({"job_id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    
+    # The deleted user has no session left, so the unguessable job_id is the
+    # credential; only admins see who the job belongs to
+    if not (user and user.is_admin):
+        job.pop("user_id", None)
+        job.pop("requested_by", None)
+    return job
 
 @api_router.put("/users/portfolio")
 async def update_portfolio(portfolio: PortfolioUpdate, user: User = Depends(get_current_user)):
     """Update user's portfolio (ordered list of item_ids)"""
     # Get settings for max items
-    settings = await db.settings.find_one({"setting_id": "global_settings"}, {"_id": 0})
-    max_items = settings.get("max_portfolio_items", 7) if settings else 7
+    settings = await get_cached_settings()
+    max_items = settings.get("max_portfolio_items", 7)
     
     if len(portfolio.item_ids) > max_items:
         raise HTTPException(status_code=400, detail=f"Portfolio can have at most {max_items} items")
     
     # Verify all items belong to user and exist
-    for item_id in portfolio.item_ids:
-        item = await db.items.find_one({"item_id": item_id, "user_id": user.user_id}, {"_id": 0})
-        if not item:
-            raise HTTPException(status_code=400, detail=f"Item {item_id} not found or doesn't belong to you")
-    
-    await db.users.update_one(
+    requested_ids = list(dict.fromkeys(portfolio.item_ids))
+    owned = await db.items.find(
+        {"item_id": {"$in": requested_ids}, "user_id": user.user_id},
+        {"_id": 0, "item_id": 1}
+    ).to_list(None)
+    if len(owned) != len(requested_ids):
+        owned_ids = {item["item_id"] for item in owned}
+        missing_id = next(item_id for item_id in requested_ids if item_id not in owned_ids)
+        raise HTTPException(status_code=400, detail=f"Item {missing_id} not found or doesn't belong to you")
+    
+    updated_user = await db.users.find_one_and_update(
         {"user_id": user.user_id},
-        {"$set": {"portfolio": portfolio.item_ids}}
+        {"$set": {"portfolio": portfolio.item_ids}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
-    
-    updated_user = await db.users.find_one({"user_id": user.user_id}, {"_id": 0})
-    return updated_user
+    return derive_rating(updated_user)
 
 @api_router.get("/users/{user_id}/portfolio")
 async def get_user_portfolio(user_id: str):
@@ -519,18 +1567,16 @@ async def get_items(
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
     bottom_category: Optional[str] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    include: Optional[str] = None
 ):
-    """Get all available items, optionally filtered by category or user, sorted by boost"""
+    """Get all available items, optionally filtered by category or user, sorted by boost; include=owner embeds owner summaries"""
     query = {"is_available": True}
     if category:
         query["category"] = category
-        # Increment category click count
-        await db.categories.update_one(
-            {"name": category},
-            {"$inc": {"click_count": 1}},
-            upsert=True
-        )
+        # Count clicks on known categories only; an anonymous query string must not create one
+        if category in await get_category_tree():
+            await db.categories.update_one({"name": category}, {"$inc": {"click_count": 1}})
     if subcategory:
         query["subcategory"] = subcategory
     if bottom_category:
@@ -546,6 +1592,11 @@ async def get_items(
         if isinstance(item.get("created_at"), str):
             item["created_at"] = datetime.fromisoformat(item["created_at"])
     
+    if include and "owner" in include.split(","):
+        owners = await get_user_summaries(item["user_id"] for item in items)
+        for item in items:
+            item["owner"] = owners.get(item["user_id"])
+    
     return items
 
 @api_router.get("/items/{item_id}")
@@ -558,31 +1609,33 @@ async def get_item(item_id: str):
     # Get owner info
     owner = await db.users.find_one({"user_id": item["user_id"]}, {"_id": 0})
     
-    return {"item": item, "owner": owner}
+    return {"item": item, "owner": derive_rating(owner)}
 
 @api_router.post("/items")
 async def create_item(item_data: ItemCreate, user: User = Depends(get_current_user)):
     """Create a new item for trade"""
+    categories = await get_category_tree()
+    
     # Validate category exists
     category = item_data.category.strip().lower()
-    existing_cat = await db.categories.find_one({"name": category, "level": 0}, {"_id": 0})
-    if not existing_cat:
+    existing_cat = categories.get(category)
+    if not existing_cat or existing_cat["level"] != 0:
         raise HTTPException(status_code=400, detail="Category does not exist. Please select from available categories or request a new one.")
     
     # Validate subcategory if provided
     subcategory = None
     if item_data.subcategory:
         subcategory = item_data.subcategory.strip().lower()
-        existing_sub = await db.categories.find_one({"name": subcategory, "parent_category": category, "level": 1}, {"_id": 0})
-        if not existing_sub:
+        existing_sub = categories.get(subcategory)
+        if not existing_sub or existing_sub["parent_category"] != category or existing_sub["level"] != 1:
             raise HTTPException(status_code=400, detail="Subcategory does not exist under this category.")
     
     # Validate bottom_category if provided
     bottom_category = None
     if item_data.bottom_category and subcategory:
         bottom_category = item_data.bottom_category.strip().lower()
-        existing_bottom = await db.categories.find_one({"name": bottom_category, "parent_category": subcategory, "level": 2}, {"_id": 0})
-        if not existing_bottom:
+        existing_bottom = categories.get(bottom_category)
+        if not existing_bottom or existing_bottom["parent_category"] != subcategory or existing_bottom["level"] != 2:
             raise HTTPException(status_code=400, detail="Bottom category does not exist under this subcategory.")
     
     item = Item(
@@ -601,6 +1654,12 @@ async def create_item(item_data: ItemCreate, user: User = Depends(get_current_us
     # Create a copy for insertion to avoid _id contamination
     insert_dict = item_dict.copy()
     await db.items.insert_one(insert_dict)
+    invalidate_search_cache()
+    await asyncio.gather(
+        bump_counters(items_total=1, items_available=1),
+        bump_daily_rollup(items_posted=1),
+        record_changes("items", "insert", [item_dict["item_id"]])
+    )
     
     # Increment category click count
     await db.categories.update_one({"name": category}, {"$inc": {"click_count": 1}})
@@ -625,7 +1684,13 @@ async def delete_item(item_id: str, user: User = Depends(get_current_user)):
     # Delete pins for this item
     await db.pins.delete_many({"item_id": item_id})
     
-    await db.items.delete_one({"item_id": item_id})
+    result = await db.items.delete_one({"item_id": item_id})
+    if result.deleted_count:
+        invalidate_search_cache()
+        await asyncio.gather(
+            bump_counters(**deleted_counter_deltas("items", [item])),
+            record_changes("items", "delete", [item_id])
+        )
     return {"message": "Item deleted"}
 
 @api_router.get("/my-items")
@@ -655,6 +1720,7 @@ async def pin_item(item_id: str, user: User = Depends(get_current_user)):
     
     insert_dict = pin_dict.copy()
     await db.pins.insert_one(insert_dict)
+    await bump_daily_rollup(pins=1)
     
     # Update item boost score
     new_score = await update_item_boost(item_id)
@@ -693,6 +1759,17 @@ async def get_categories(level: Optional[int] = None, parent: Optional[str] = No
     categories = await db.categories.find(query, {"_id": 0}).sort("click_count", -1).to_list(50)
     return categories
 
+@api_router.get("/categories/tree")
+async def get_category_tree_endpoint():
+    """Get the whole category hierarchy in one response, popular categories first"""
+    nodes = await get_category_tree()
+    roots = sorted(
+        (node for node in nodes.values() if node["level"] == 0),
+        key=lambda n: n["click_count"],
+        reverse=True
+    )
+    return [category_subtree(nodes, root["name"]) for root in roots]
+
 # ============== CATEGORY REQUEST ENDPOINTS ==============
 
 @api_router.post("/category-requests")
@@ -769,22 +1846,31 @@ async def admin_approve_category_request(request_id: str, admin: User = Depends(
     # Determine level
     level = 0
     parent = req.get("parent_category")
+    parent_cat = None
     if parent:
         parent_cat = await db.categories.find_one({"name": parent}, {"_id": 0})
         if parent_cat:
             level = parent_cat.get("level", 0) + 1
     
     # Create the category
-    await db.categories.update_one(
+    result = await db.categories.update_one(
         {"name": req["category_name"]},
         {"$setOnInsert": {
             "name": req["category_name"],
             "click_count": 0,
             "parent_category": parent,
-            "level": level
+            "level": level,
+            "path": category_child_path(parent_cat, req["category_name"])
         }},
         upsert=True
     )
+    if result.upserted_id is not None:
+        invalidate_category_tree()
+        invalidate_search_cache()
+        await asyncio.gather(
+            bump_counters(categories_total=1),
+            record_changes("categories", "insert", [req["category_name"]])
+        )
     
     # Update request status
     await db.category_requests.update_one(
@@ -822,6 +1908,7 @@ async def admin_create_category(data: AdminCreateCategory, admin: User = Depends
     # Determine level
     level = 0
     parent = None
+    parent_cat = None
     if data.parent_category:
         parent = data.parent_category.strip().lower()
         parent_cat = await db.categories.find_one({"name": parent}, {"_id": 0})
@@ -835,8 +1922,12 @@ async def admin_create_category(data: AdminCreateCategory, admin: User = Depends
         "name": name,
         "click_count": 0,
         "parent_category": parent,
-        "level": level
+        "level": level,
+        "path": category_child_path(parent_cat, name)
     })
+    invalidate_category_tree()
+    invalidate_search_cache()
+    await asyncio.gather(bump_counters(categories_total=1), record_changes("categories", "insert", [name]))
     
     return {"name": name, "parent_category": parent, "level": level}
 
@@ -851,9 +1942,18 @@ async def global_search(q: str, type: Optional[str] = None, user: User = Depends
         "categories": []
     }
     
-    if not q or len(q) < 2:
+    q = normalize_search_query(q or "")
+    if len(q) < 2:
         return results
     
+    # Results don't depend on who is searching, so popular queries are shared
+    cache_key = (q, type)
+    cached = get_cached_search(cache_key)
+    if cached is not None:
+        return cached
+    # Taken before querying so a write that lands mid-search leaves the entry stale
+    version = search_cache_state["version"]
+    
     # Search users
     if type is None or type == "users":
         users = await db.users.find({
@@ -862,7 +1962,7 @@ async def global_search(q: str, type: Optional[str] = None, user: User = Depends
                 {"username": {"$regex": q, "$options": "i"}}
             ]
         }, {"_id": 0, "email": 0}).limit(10).to_list(10)
-        results["users"] = users
+        results["users"] = [derive_rating(u) for u in users]
     
     # Search items
     if type is None or type == "items":
@@ -883,8 +1983,78 @@ async def global_search(q: str, type: Optional[str] = None, user: User = Depends
         }, {"_id": 0}).limit(10).to_list(10)
         results["categories"] = categories
     
+    store_cached_search(cache_key, results, version)
     return results
 
+# ============== CHANGE FEED ==============
+
+# Field identifying documents of each logged collection
+CHANGE_KEY_FIELDS = {"items": "item_id", "categories": "name"}
+
+@api_router.get("/changes")
+async def get_changes(since: int = 0, limit: int = CHANGES_PAGE_MAX):
+    """
+    Item and category changes after sequence number `since`, oldest first.
+    
+    Each key appears once with its current document (or op "delete" if it no
+    longer exists). Pass `next` back as `since` to continue; when
+    `reset_required` is true the log no longer reaches back to `since`, so
+    reload everything and resume from `head`.
+    """
+    limit = max(1, min(limit, CHANGES_PAGE_MAX))
+    changes, oldest, counter = await asyncio.gather(
+        db.changes.find({"seq": {"$gt": since}}, {"_id": 0}).sort("seq", 1).limit(limit).to_list(limit),
+        db.changes.find({}, {"_id": 0, "seq": 1}).sort("seq", 1).limit(1).to_list(1),
+        db.counters.find_one({"counter_id": CHANGE_SEQUENCE_ID}, {"_id": 0, "seq": 1})
+    )
+    head = counter["seq"] if counter else 0
+    reset_required = bool(oldest) and since < oldest[0]["seq"] - 1
+    
+    # Stop at a fresh gap: that sequence number may belong to a write not yet inserted
+    settle_cutoff = (datetime.now(timezone.utc) - timedelta(seconds=CHANGE_SETTLE_SECONDS)).isoformat()
+    contiguous = []
+    expected = since + 1
+    for change in changes:
+        if change["seq"] != expected and change["recorded_at"] > settle_cutoff and not reset_required:
+            break
+        contiguous.append(change)
+        expected = change["seq"] + 1
+    
+    # Latest change per document, resolved to the document's current state
+    latest = {}
+    for change in contiguous:
+        latest.pop((change["collection"], change["key"]), None)
+        latest[(change["collection"], change["key"])] = change
+    keys_by_collection: Dict[str, List[str]] = {}
+    for collection_name, key in latest:
+        keys_by_collection.setdefault(collection_name, []).append(key)
+    lookups = await asyncio.gather(*[
+        db[collection_name].find({CHANGE_KEY_FIELDS[collection_name]: {"$in": keys}}, {"_id": 0}).to_list(None)
+        for collection_name, keys in keys_by_collection.items()
+    ])
+    docs = {
+        (collection_name, doc[CHANGE_KEY_FIELDS[collection_name]]): doc
+        for collection_name, found in zip(keys_by_collection, lookups)
+        for doc in found
+    }
+    
+    return {
+        "changes": [
+            {
+                "seq": change["seq"],
+                "collection": collection_name,
+                "key": key,
+                "op": change["op"] if (collection_name, key) in docs else "delete",
+                "doc": docs.get((collection_name, key))
+            }
+            for (collection_name, key), change in latest.items()
+        ],
+        "next": contiguous[-1]["seq"] if contiguous else since,
+        "has_more": len(contiguous) == limit,
+        "reset_required": reset_required,
+        "head": head
+    }
+
 # ============== MESSAGE ENDPOINTS ==============
 
 @api_router.get("/conversations")
@@ -909,12 +2079,42 @@ async def get_conversations(user: User = Depends(get_current_user)):
         {"$sort": {"last_message_time": -1}}
     ]
     
-    conversations = await db.messages.aggregate(pipeline).to_list(50)
+    # Conversations whose messages are all archived only show up in buckets
+    archived_pipeline = [
+        {"$match": {"participants": user.user_id}},
+        {"$sort": {"last_at": -1}},
+        {"$group": {
+            "_id": "$conversation",
+            "last_message": {"$first": "$last_message"}
+        }},
+        {"$sort": {"last_message.created_at": -1}},
+        {"$limit": 50}
+    ]
+    conversations, archived = await asyncio.gather(
+        db.messages.aggregate(pipeline).to_list(50),
+        db.message_buckets.aggregate(archived_pipeline).to_list(50)
+    )
+    active_partners = {conv["_id"] for conv in conversations}
+    for bucket in archived:
+        last = bucket["last_message"]
+        partner_id = last["receiver_id"] if last["sender_id"] == user.user_id else last["sender_id"]
+        if partner_id not in active_partners:
+            active_partners.add(partner_id)
+            conversations.append({
+                "_id": partner_id,
+                "last_message": last["content"],
+                "last_message_time": last["created_at"],
+                "item_id": last.get("item_id")
+            })
+    conversations.sort(key=lambda conv: conv["last_message_time"], reverse=True)
+    conversations = conversations[:50]
+    
+    # Get public summaries for all partners in one query
+    partners_by_id = await get_user_summaries(conv["_id"] for conv in conversations)
     
-    # Get user info for each conversation
     result = []
     for conv in conversations:
-        partner = await db.users.find_one({"user_id": conv["_id"]}, {"_id": 0})
+        partner = partners_by_id.get(conv["_id"])
         if partner:
             result.append({
                 "partner": partner,
@@ -926,16 +2126,15 @@ async def get_conversations(user: User = Depends(get_current_user)):
     return result
 
 @api_router.get("/messages/{partner_id}")
-async def get_messages(partner_id: str, user: User = Depends(get_current_user)):
-    """Get messages with a specific user"""
-    messages = await db.messages.find({
-        "$or": [
-            {"sender_id": user.user_id, "receiver_id": partner_id},
-            {"sender_id": partner_id, "receiver_id": user.user_id}
-        ]
-    }, {"_id": 0}).sort("created_at", 1).to_list(100)
-    
-    return messages
+async def get_messages(
+    partner_id: str,
+    before: Optional[str] = None,
+    limit: int = 100,
+    user: User = Depends(get_current_user)
+):
+    """Get the latest messages with a specific user; pass the oldest created_at as `before` for earlier ones"""
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+    return await read_conversation_history(user.user_id, partner_id, before, limit)
 
 @api_router.post("/messages")
 async def send_message(msg: MessageCreate, user: User = Depends(get_current_user)):
@@ -991,6 +2190,7 @@ async def create_trade(trade_data: TradeCreate, user: User = Depends(get_current
     # Create a copy for insertion to avoid _id contamination
     insert_dict = trade_dict.copy()
     await db.trades.insert_one(insert_dict)
+    await asyncio.gather(bump_counters(trades_total=1), bump_daily_rollup(trades_opened=1))
     return trade_dict
 
 @api_router.get("/trades")
@@ -1000,17 +2200,23 @@ async def get_my_trades(user: User = Depends(get_current_user)):
         "$or": [{"owner_id": user.user_id}, {"trader_id": user.user_id}]
     }, {"_id": 0}).sort("created_at", -1).to_list(50)
     
-    # Enrich with item and user data
+    # Enrich with item and user data, one query per collection
+    item_ids = list({trade["item_id"] for trade in trades})
+    user_ids = list({trade["owner_id"] for trade in trades} | {trade["trader_id"] for trade in trades})
+    items, users = await asyncio.gather(
+        db.items.find({"item_id": {"$in": item_ids}}, {"_id": 0}).to_list(None),
+        db.users.find({"user_id": {"$in": user_ids}}, {"_id": 0}).to_list(None)
+    )
+    items_by_id = {item["item_id"]: item for item in items}
+    users_by_id = {u["user_id"]: derive_rating(u) for u in users}
+    
     result = []
     for trade in trades:
-        item = await db.items.find_one({"item_id": trade["item_id"]}, {"_id": 0})
-        owner = await db.users.find_one({"user_id": trade["owner_id"]}, {"_id": 0})
-        trader = await db.users.find_one({"user_id": trade["trader_id"]}, {"_id": 0})
         result.append({
             "trade": trade,
-            "item": item,
-            "owner": owner,
-            "trader": trader
+            "item": items_by_id.get(trade["item_id"]),
+            "owner": users_by_id.get(trade["owner_id"]),
+            "trader": users_by_id.get(trade["trader_id"])
         })
     
     return result
@@ -1030,57 +2236,100 @@ async def get_trade(trade_id: str, user: User = Depends(get_current_user)):
     owner = await db.users.find_one({"user_id": trade["owner_id"]}, {"_id": 0})
     trader = await db.users.find_one({"user_id": trade["trader_id"]}, {"_id": 0})
     
-    return {"trade": trade, "item": item, "owner": owner, "trader": trader}
+    return {"trade": trade, "item": item, "owner": derive_rating(owner), "trader": derive_rating(trader)}
+
+# Cleared the first time MongoDB rejects a transaction, e.g. a standalone mongod without a replica set
+transactions_state = {"supported": True}
+
+async def complete_trade(trade_id: str, session=None):
+    """Open -> completed transition, the item going unavailable and both users' points; (None, None) if already completed"""
+    completed_trade = await db.trades.find_one_and_update(
+        {"trade_id": trade_id, "is_completed": False},
+        {"$set": {
+            "is_completed": True,
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not completed_trade:
+        return None, None
+    
+    # Sequential: a session can't carry concurrent operations
+    item_result = await db.items.update_one(
+        {"item_id": completed_trade["item_id"]},
+        {"$set": {"is_available": False}},
+        session=session
+    )
+    await db.users.update_many(
+        {"user_id": {"$in": [completed_trade["owner_id"], completed_trade["trader_id"]]}},
+        {"$inc": {"trade_points": 1}},
+        session=session
+    )
+    return completed_trade, item_result
+
+async def complete_trade_atomically(trade_id: str):
+    """complete_trade in one transaction so a failure can't leave a completed trade with its item still listed"""
+    if transactions_state["supported"]:
+        try:
+            async with await client.start_session() as session:
+                # Retries on TransientTransactionError, so a confirm that loses a write
+                # conflict to the other party's re-runs and finds the trade completed
+                return await session.with_transaction(lambda s: complete_trade(trade_id, s))
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set or mongos. Nothing was written.
+            if e.code != 20:
+                raise
+            transactions_state["supported"] = False
+            logger.warning("MongoDB does not support transactions; completing trades without one")
+    return await complete_trade(trade_id)
 
 @api_router.post("/trades/{trade_id}/confirm")
 async def confirm_trade(trade_id: str, user: User = Depends(get_current_user)):
     """Confirm trade completion (both parties must confirm)"""
-    trade = await db.trades.find_one({"trade_id": trade_id}, {"_id": 0})
-    if not trade:
-        raise HTTPException(status_code=404, detail="Trade not found")
-    
-    if trade["is_completed"]:
-        raise HTTPException(status_code=400, detail="Trade already completed")
-    
-    # Determine which party is confirming
-    update_field = None
-    if trade["owner_id"] == user.user_id:
-        update_field = "owner_confirmed"
-    elif trade["trader_id"] == user.user_id:
-        update_field = "trader_confirmed"
-    else:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    # Update confirmation
-    await db.trades.update_one(
-        {"trade_id": trade_id},
-        {"$set": {update_field: True}}
+    # Set this party's confirmation flag in one atomic round trip. The filter only
+    # matches open trades the user takes part in, so the flag the user owns is
+    # decided server-side and concurrent confirmations cannot overwrite each other.
+    updated_trade = await db.trades.find_one_and_update(
+        {
+            "trade_id": trade_id,
+            "is_completed": False,
+            "$or": [{"owner_id": user.user_id}, {"trader_id": user.user_id}]
+        },
+        [{"$set": {
+            "owner_confirmed": {"$or": ["$owner_confirmed", {"$eq": ["$owner_id", user.user_id]}]},
+            "trader_confirmed": {"$or": ["$trader_confirmed", {"$eq": ["$trader_id", user.user_id]}]}
+        }}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    # Check if both confirmed
-    updated_trade = await db.trades.find_one({"trade_id": trade_id}, {"_id": 0})
+    if not updated_trade:
+        # Only the failure path pays for a second read to pick the right error
+        trade = await db.trades.find_one({"trade_id": trade_id}, {"_id": 0})
+        if not trade:
+            raise HTTPException(status_code=404, detail="Trade not found")
+        if trade["owner_id"] != user.user_id and trade["trader_id"] != user.user_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        raise HTTPException(status_code=400, detail="Trade already completed")
     
     if updated_trade["owner_confirmed"] and updated_trade["trader_confirmed"]:
-        # Complete the trade
-        await db.trades.update_one(
-            {"trade_id": trade_id},
-            {"$set": {
-                "is_completed": True,
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        # Mark item as unavailable
-        await db.items.update_one(
-            {"item_id": trade["item_id"]},
-            {"$set": {"is_available": False}}
-        )
+        # Complete the trade. Only one caller can win the open -> completed
+        # transition, so the side-effects below run exactly once.
+        completed_trade, item_result = await complete_trade_atomically(trade_id)
         
-        # Award trade points to both users
-        await db.users.update_one({"user_id": trade["owner_id"]}, {"$inc": {"trade_points": 1}})
-        await db.users.update_one({"user_id": trade["trader_id"]}, {"$inc": {"trade_points": 1}})
-        
-        updated_trade = await db.trades.find_one({"trade_id": trade_id}, {"_id": 0})
+        if completed_trade:
+            invalidate_search_cache()
+            await asyncio.gather(
+                bump_counters(trades_completed=1, items_available=-item_result.modified_count),
+                bump_daily_rollup(trades_completed=1),
+                record_changes("items", "update", [completed_trade["item_id"]])
+            )
+            updated_trade = completed_trade
+        else:
+            # The other party's concurrent confirmation completed it first
+            updated_trade = await db.trades.find_one({"trade_id": trade_id}, {"_id": 0})
     
     return updated_trade
 
@@ -1114,23 +2363,22 @@ async def rate_trade(trade_id: str, rating_data: RatingCreate, user: User = Depe
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Save rating in trade
-    await db.trades.update_one(
-        {"trade_id": trade_id},
+    # Save rating in trade, only if this party hasn't rated concurrently
+    result = await db.trades.update_one(
+        {"trade_id": trade_id, rating_field: None},
         {"$set": {rating_field: rating_data.rating}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Already rated")
     
-    # Update user's average rating
-    rated_user = await db.users.find_one({"user_id": rated_user_id}, {"_id": 0})
-    current_rating = rated_user.get("rating") or 0
-    rating_count = rated_user.get("rating_count", 0)
-    
-    new_rating_count = rating_count + 1
-    new_rating = ((current_rating * rating_count) + rating_data.rating) / new_rating_count
-    
+    # Update user's rating aggregates; the average is derived on read
     await db.users.update_one(
         {"user_id": rated_user_id},
-        {"$set": {"rating": round(new_rating, 1), "rating_count": new_rating_count}}
+        {"$inc": {
+            "rating_sum": rating_data.rating,
+            "rating_count": 1,
+            f"rating_histogram.{rating_data.rating}": 1
+        }}
     )
     
     return {"message": "Rating submitted", "rating": rating_data.rating}
@@ -1155,6 +2403,7 @@ async def create_report(report_data: ReportCreate, user: User = Depends(get_curr
     
     insert_dict = report_dict.copy()
     await db.reports.insert_one(insert_dict)
+    await asyncio.gather(bump_counters(reports_pending=1), bump_daily_rollup(reports_filed=1))
     
     return {"message": "Report submitted", "report_id": report.report_id}
 
@@ -1173,7 +2422,7 @@ async def get_reports(status: Optional[str] = None, admin: User = Depends(get_ad
         reporter = await db.users.find_one({"user_id": report["reporter_id"]}, {"_id": 0})
         result.append({
             "report": report,
-            "reporter": reporter
+            "reporter": derive_rating(reporter)
         })
     
     return result
@@ -1184,14 +2433,19 @@ async def update_report(report_id: str, status: str, admin: User = Depends(get_a
     if status not in ["pending", "reviewed", "resolved"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.reports.update_one(
+    previous = await db.reports.find_one_and_update(
         {"report_id": report_id},
-        {"$set": {"status": status}}
+        {"$set": {"status": status}},
+        projection={"_id": 0, "status": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Report not found")
     
+    was_pending = previous.get("status") == "pending"
+    await bump_counters(reports_pending=int(status == "pending") - int(was_pending))
+    
     return {"message": "Report updated"}
 
 # ============== ADMIN ENDPOINTS ==============
@@ -1206,20 +2460,19 @@ async def admin_delete_user(user_id: str, admin: User = Depends(get_admin_user))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Delete user's items
-    await db.items.delete_many({"user_id": user_id})
-    # Delete user's messages
-    await db.messages.delete_many({"$or": [{"sender_id": user_id}, {"receiver_id": user_id}]})
-    # Delete user's trades
-    await db.trades.delete_many({"$or": [{"owner_id": user_id}, {"trader_id": user_id}]})
-    # Delete user's pins
-    await db.pins.delete_many({"user_id": user_id})
-    # Delete user's sessions
-    await db.user_sessions.delete_many({"user_id": user_id})
-    # Delete user
-    await db.users.delete_one({"user_id": user_id})
+    job = await enqueue_account_deletion(user_id, requested_by=admin.user_id)
+    
+    return {"message": "User deletion started", "job_id": job["job_id"], "status": job["status"]}
+
+@api_router.get("/admin/deletion-jobs")
+async def admin_list_deletion_jobs(status: Optional[str] = None, admin: User = Depends(get_admin_user)):
+    """List account deletion jobs (admin only)"""
+    query = {}
+    if status:
+        query["status"] = status
     
-    return {"message": "User deleted"}
+    jobs = await db.deletion_jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    return jobs
 
 @api_router.delete("/admin/items/{item_id}")
 async def admin_delete_item(item_id: str, admin: User = Depends(get_admin_user)):
@@ -1237,21 +2490,114 @@ async def admin_delete_item(item_id: str, admin: User = Depends(get_admin_user))
     # Delete pins for this item
     await db.pins.delete_many({"item_id": item_id})
     
-    await db.items.delete_one({"item_id": item_id})
+    result = await db.items.delete_one({"item_id": item_id})
+    if result.deleted_count:
+        invalidate_search_cache()
+        await asyncio.gather(
+            bump_counters(**deleted_counter_deltas("items", [item])),
+            record_changes("items", "delete", [item_id])
+        )
     return {"message": "Item deleted"}
 
 @api_router.delete("/admin/categories/{category_name}")
 async def admin_delete_category(category_name: str, admin: User = Depends(get_admin_user)):
-    """Delete a category (admin only)"""
-    result = await db.categories.delete_one({"name": category_name})
-    if result.deleted_count == 0:
+    """Delete a category and its whole subtree (admin only)"""
+    category = await db.categories.find_one({"name": category_name}, {"_id": 0, "name": 1, "path": 1})
+    if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    # Also delete child categories
-    await db.categories.delete_many({"parent_category": category_name})
+    subtree_query = category_subtree_query([category.get("path") or category["name"]])
+    subtree = await db.categories.find(subtree_query, {"_id": 0, "name": 1}).to_list(None)
+    result = await db.categories.delete_many(subtree_query)
+    invalidate_category_tree()
+    invalidate_search_cache()
+    await asyncio.gather(
+        bump_counters(categories_total=-result.deleted_count),
+        record_changes("categories", "delete", [cat["name"] for cat in subtree])
+    )
     
     return {"message": "Category deleted"}
 
+@api_router.put("/admin/categories/{category_name}/move")
+async def admin_move_category(category_name: str, data: MoveCategory, admin: User = Depends(get_admin_user)):
+    """Move a category and its subtree under another parent at the same depth (admin only)"""
+    new_parent = data.parent_category.strip().lower()
+    found = await db.categories.find(
+        {"name": {"$in": [category_name, new_parent]}},
+        {"_id": 0}
+    ).to_list(2)
+    by_name = {cat["name"]: cat for cat in found}
+    category = by_name.get(category_name)
+    parent_cat = by_name.get(new_parent)
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if not parent_cat:
+        raise HTTPException(status_code=404, detail="Parent category not found")
+    
+    level = category.get("level", 0)
+    # Items store one category name per level, so moves must keep the depth
+    if parent_cat.get("level", 0) != level - 1:
+        raise HTTPException(status_code=400, detail="New parent must be one level above the category")
+    
+    old_path = category.get("path") or category["name"]
+    new_path = category_child_path(parent_cat, category_name)
+    
+    # Rewrite the subtree's paths and re-point items at their new ancestors
+    ancestors = new_path.split("/")[:-1]
+    item_query = {CATEGORY_LEVEL_FIELDS[level]: category_name}
+    subtree, moved_items = await asyncio.gather(
+        db.categories.find(category_subtree_query([old_path]), {"_id": 0, "name": 1}).to_list(None),
+        db.items.find(item_query, {"_id": 0, "item_id": 1}).to_list(None)
+    )
+    await asyncio.gather(
+        db.categories.update_many(
+            category_subtree_query([old_path]),
+            [{"$set": {
+                "path": {"$concat": [
+                    {"$literal": new_path},
+                    {"$substrCP": ["$path", len(old_path), {"$subtract": [{"$strLenCP": "$path"}, len(old_path)]}]}
+                ]},
+                "parent_category": {"$cond": [
+                    {"$eq": ["$name", {"$literal": category_name}]},
+                    {"$literal": new_parent},
+                    "$parent_category"
+                ]}
+            }}]
+        ),
+        db.items.update_many(
+            item_query,
+            {"$set": dict(zip(CATEGORY_LEVEL_FIELDS, ancestors))}
+        )
+    )
+    invalidate_category_tree()
+    invalidate_search_cache()
+    await asyncio.gather(
+        record_changes("categories", "update", [cat["name"] for cat in subtree]),
+        record_changes("items", "update", [item["item_id"] for item in moved_items])
+    )
+    
+    return {"name": category_name, "parent_category": new_parent, "level": level, "path": new_path}
+
+@api_router.get("/admin/categories/{category_name}/subtree")
+async def admin_get_category_subtree(category_name: str, admin: User = Depends(get_admin_user)):
+    """Get a category's descendants and the number of items anywhere in its subtree (admin only)"""
+    category = await db.categories.find_one({"name": category_name}, {"_id": 0})
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    level = category.get("level", 0)
+    path = category.get("path") or category["name"]
+    descendants, item_count = await asyncio.gather(
+        db.categories.find(
+            {"path": {"$regex": f"^{re.escape(path)}/"}},
+            {"_id": 0}
+        ).sort("path", 1).to_list(None),
+        # Items carry every ancestor's name, so one indexed count covers the subtree
+        db.items.count_documents({CATEGORY_LEVEL_FIELDS[level]: category_name})
+    )
+    
+    return {"category": category, "descendants": descendants, "item_count": item_count}
+
 # ============== ADMIN MANAGEMENT ENDPOINTS ==============
 
 @api_router.get("/admin/users")
@@ -1272,7 +2618,7 @@ async def admin_list_users(
         query["is_suspended"] = True
     
     users = await db.users.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return users
+    return [derive_rating(u) for u in users]
 
 @api_router.get("/admin/items")
 async def admin_list_items(
@@ -1329,26 +2675,34 @@ async def admin_suspend_user(user_id: str, data: SuspendUser, admin: User = Depe
     
     if data.days <= 0:
         # Unsuspend
-        await db.users.update_one(
+        previous = await db.users.find_one_and_update(
             {"user_id": user_id},
             {"$set": {
                 "is_suspended": False,
                 "suspended_until": None,
                 "suspension_reason": None
-            }}
+            }},
+            projection={"_id": 0, "is_suspended": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if previous and previous.get("is_suspended"):
+            await bump_counters(users_suspended=-1)
         return {"message": "User unsuspended"}
     else:
         # Suspend
         suspended_until = datetime.now(timezone.utc) + timedelta(days=data.days)
-        await db.users.update_one(
+        previous = await db.users.find_one_and_update(
             {"user_id": user_id},
             {"$set": {
                 "is_suspended": True,
                 "suspended_until": suspended_until.isoformat(),
                 "suspension_reason": data.reason or f"Suspended for {data.days} days"
-            }}
+            }},
+            projection={"_id": 0, "is_suspended": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if previous and not previous.get("is_suspended"):
+            await bump_counters(users_suspended=1)
         # Also invalidate their sessions
         await db.user_sessions.delete_many({"user_id": user_id})
         return {"message": f"User suspended until {suspended_until.strftime('%Y-%m-%d %H:%M UTC')}"}
@@ -1356,56 +2710,137 @@ async def admin_suspend_user(user_id: str, data: SuspendUser, admin: User = Depe
 @api_router.post("/admin/items/bulk-delete")
 async def admin_bulk_delete_items(data: BulkDeleteItems, admin: User = Depends(get_admin_user)):
     """Delete multiple items at once (admin only)"""
-    deleted_count = 0
-    for item_id in data.item_ids:
-        item = await db.items.find_one({"item_id": item_id}, {"_id": 0})
-        if item:
-            # Remove from portfolio if present
-            await db.users.update_one(
-                {"user_id": item["user_id"]},
-                {"$pull": {"portfolio": item_id}}
-            )
-            # Delete pins
-            await db.pins.delete_many({"item_id": item_id})
-            # Delete item
-            await db.items.delete_one({"item_id": item_id})
-            deleted_count += 1
+    item_ids = list(dict.fromkeys(data.item_ids))
+    items = await db.items.find(
+        {"item_id": {"$in": item_ids}},
+        {"_id": 0, "item_id": 1, "user_id": 1, "is_available": 1}
+    ).to_list(None)
+    if not items:
+        return {"message": "Deleted 0 items"}
+    
+    # One $pull per owner covering all of that owner's items
+    item_ids_by_owner = {}
+    for item in items:
+        item_ids_by_owner.setdefault(item["user_id"], []).append(item["item_id"])
+    found_ids = [item["item_id"] for item in items]
+    
+    # Remove from portfolios and delete pins, then delete the items
+    await asyncio.gather(
+        db.users.bulk_write([
+            UpdateOne({"user_id": owner_id}, {"$pull": {"portfolio": {"$in": owner_item_ids}}})
+            for owner_id, owner_item_ids in item_ids_by_owner.items()
+        ], ordered=False),
+        db.pins.delete_many({"item_id": {"$in": found_ids}})
+    )
+    result = await db.items.delete_many({"item_id": {"$in": found_ids}})
+    invalidate_search_cache()
+    await asyncio.gather(
+        bump_counters(**deleted_counter_deltas("items", items)),
+        record_changes("items", "delete", found_ids)
+    )
     
-    return {"message": f"Deleted {deleted_count} items"}
+    return {"message": f"Deleted {result.deleted_count} items"}
 
 @api_router.post("/admin/categories/bulk-delete")
 async def admin_bulk_delete_categories(data: BulkDeleteCategories, admin: User = Depends(get_admin_user)):
     """Delete multiple categories at once (admin only)"""
-    deleted_count = 0
-    for name in data.category_names:
-        result = await db.categories.delete_one({"name": name})
-        if result.deleted_count > 0:
-            # Also delete child categories
-            await db.categories.delete_many({"parent_category": name})
-            deleted_count += 1
+    categories = await db.categories.find(
+        {"name": {"$in": list(set(data.category_names))}},
+        {"_id": 0, "name": 1, "path": 1}
+    ).to_list(None)
+    if not categories:
+        return {"message": "Deleted 0 categories"}
+    
+    # One delete covers every named category and all of their descendants
+    subtree_query = category_subtree_query([cat.get("path") or cat["name"] for cat in categories])
+    subtree = await db.categories.find(subtree_query, {"_id": 0, "name": 1}).to_list(None)
+    result = await db.categories.delete_many(subtree_query)
+    invalidate_category_tree()
+    invalidate_search_cache()
+    await asyncio.gather(
+        bump_counters(categories_total=-result.deleted_count),
+        record_changes("categories", "delete", [cat["name"] for cat in subtree])
+    )
     
-    return {"message": f"Deleted {deleted_count} categories"}
+    return {"message": f"Deleted {len(categories)} categories"}
 
 @api_router.get("/admin/stats")
 async def admin_get_stats(admin: User = Depends(get_admin_user)):
     """Get platform statistics (admin only)"""
-    total_users = await db.users.count_documents({})
-    suspended_users = await db.users.count_documents({"is_suspended": True})
-    total_items = await db.items.count_documents({})
-    available_items = await db.items.count_documents({"is_available": True})
-    total_trades = await db.trades.count_documents({})
-    completed_trades = await db.trades.count_documents({"is_completed": True})
-    pending_reports = await db.reports.count_documents({"status": "pending"})
-    total_categories = await db.categories.count_documents({})
+    counters = await db.counters.find_one({"counter_id": PLATFORM_COUNTERS_ID}, {"_id": 0})
+    if not counters or "reconciled_at" not in counters:
+        counters = await reconcile_platform_counters()
     
     return {
-        "users": {"total": total_users, "suspended": suspended_users},
-        "items": {"total": total_items, "available": available_items},
-        "trades": {"total": total_trades, "completed": completed_trades},
-        "reports": {"pending": pending_reports},
-        "categories": {"total": total_categories}
+        "users": {"total": counters.get("users_total", 0), "suspended": counters.get("users_suspended", 0)},
+        "items": {"total": counters.get("items_total", 0), "available": counters.get("items_available", 0)},
+        "trades": {"total": counters.get("trades_total", 0), "completed": counters.get("trades_completed", 0)},
+        "reports": {"pending": counters.get("reports_pending", 0)},
+        "categories": {"total": counters.get("categories_total", 0)}
     }
 
+@api_router.post("/admin/messages/compact")
+async def admin_compact_messages(older_than_days: int = MESSAGE_ARCHIVE_DAYS, admin: User = Depends(get_admin_user)):
+    """Archive messages older than the given number of days into buckets now (admin only)"""
+    if older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    return await compact_messages(older_than_days)
+
+@api_router.post("/admin/stats/reconcile")
+async def admin_reconcile_stats(admin: User = Depends(get_admin_user)):
+    """Recount platform counters immediately (admin only)"""
+    counters = await reconcile_platform_counters()
+    return {"message": "Counters reconciled", "reconciled_at": counters["reconciled_at"]}
+
+@api_router.get("/admin/analytics/daily")
+async def admin_get_daily_analytics(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    admin: User = Depends(get_admin_user)
+):
+    """Get per-day activity buckets for a date range, defaulting to the last 30 days (admin only)"""
+    try:
+        end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else datetime.now(timezone.utc).date()
+        start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else end_date - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date must not be after end date")
+    day_count = (end_date - start_date).days + 1
+    if day_count > ROLLUP_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range cannot exceed {ROLLUP_MAX_DAYS} days")
+    
+    rollups = await db.daily_rollups.find(
+        {"day": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}},
+        {"_id": 0}
+    ).to_list(day_count)
+    by_day = {rollup["day"]: rollup for rollup in rollups}
+    
+    # Days without activity have no bucket; report them as zeros
+    days = []
+    for offset in range(day_count):
+        day = (start_date + timedelta(days=offset)).isoformat()
+        bucket = by_day.get(day, {})
+        days.append({"day": day, **{metric: bucket.get(metric, 0) for metric in DAILY_ROLLUP_SOURCES}})
+    
+    return {"start": start_date.isoformat(), "end": end_date.isoformat(), "days": days}
+
+@api_router.post("/admin/analytics/rebuild")
+async def admin_rebuild_daily_analytics(admin: User = Depends(get_admin_user)):
+    """Rebuild daily activity buckets from the source collections (admin only)"""
+    day_count = await rebuild_daily_rollups()
+    return {"message": f"Rebuilt {day_count} daily buckets"}
+
+@api_router.post("/admin/ratings/backfill")
+async def admin_backfill_ratings(batch_size: int = 500, admin: User = Depends(get_admin_user)):
+    """Rebuild user rating aggregates from trade ratings (admin only)"""
+    if batch_size < 1 or batch_size > 5000:
+        raise HTTPException(status_code=400, detail="Batch size must be between 1 and 5000")
+    
+    updated = await backfill_rating_aggregates(batch_size)
+    return {"message": f"Backfilled ratings for {updated} users"}
+
 # ============== ANNOUNCEMENT ENDPOINTS ==============
 
 @api_router.get("/announcements")
@@ -1453,10 +2888,7 @@ async def delete_announcement(announcement_id: str, admin: User = Depends(get_ad
 @api_router.get("/settings")
 async def get_settings():
     """Get global settings"""
-    settings = await db.settings.find_one({"setting_id": "global_settings"}, {"_id": 0})
-    if not settings:
-        return {"setting_id": "global_settings", "max_portfolio_items": 7}
-    return settings
+    return await get_cached_settings()
 
 @api_router.put("/admin/settings")
 async def update_settings(max_portfolio_items: int, admin: User = Depends(get_admin_user)):
@@ -1469,9 +2901,32 @@ async def update_settings(max_portfolio_items: int, admin: User = Depends(get_ad
         {"$set": {"max_portfolio_items": max_portfolio_items}},
         upsert=True
     )
+    invalidate_settings_cache()
     
     return {"message": "Settings updated", "max_portfolio_items": max_portfolio_items}
 
+# ============== PAGE ENDPOINTS ==============
+
+@api_router.get("/pages/dashboard")
+async def get_dashboard_page(category: Optional[str] = None):
+    """Everything the dashboard renders on load: the feed with owner summaries and popular categories"""
+    items, categories = await asyncio.gather(
+        get_items(category=category, include="owner"),
+        get_categories()
+    )
+    return {"items": items, "categories": categories}
+
+@api_router.get("/pages/profile/{user_id}")
+async def get_profile_page(user_id: str):
+    """Everything a profile page renders on load: the user, their items, portfolio and settings"""
+    user, items, portfolio, settings = await asyncio.gather(
+        get_user(user_id),
+        get_items(user_id=user_id),
+        get_user_portfolio(user_id),
+        get_cached_settings()
+    )
+    return {"user": user, "items": items, "portfolio": portfolio, "settings": settings}
+
 # ============== FILE UPLOAD ==============
 
 @api_router.post("/upload")
@@ -1486,6 +2941,399 @@ async def upload_image(file: UploadFile = File(...), user: User = Depends(get_cu
     
     return {"image_url": data_url}
 
+# ============== METRICS ==============
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+class Histogram:
+    """
+    Fixed-bucket histogram in Prometheus layout.
+    
+    Only ever touched from the event loop thread, so plain integer updates
+    are safe without locks. Bucket counts are stored per bucket and made
+    cumulative when rendered.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        prefix = f"{labels}," if labels else ""
+        label_block = f"{{{labels}}}" if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{label_block} {self.sum:.6f}")
+        lines.append(f"{name}_count{label_block} {self.count}")
+        return lines
+
+# (method, route template, status) -> request count
+request_counts: Dict[tuple, int] = {}
+# (method, route template) -> latency histogram
+request_latency: Dict[tuple, Histogram] = {}
+runtime_gauges = {"requests_in_flight": 0, "event_loop_lag_seconds": 0.0}
+event_loop_lag = Histogram()
+
+# (method, route template) -> accumulated database work
+route_db_stats: Dict[tuple, dict] = {}
+
+def record_request_db_stats(method: str, route: str, elapsed: float, stats: RequestDbStats):
+    """Fold one request's database work into its route totals, flagging slow and N+1 requests"""
+    totals = route_db_stats.get((method, route))
+    if totals is None:
+        totals = route_db_stats[(method, route)] = {
+            "requests": 0,
+            "commands": 0,
+            "max_commands": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+            "db_time": 0.0,
+            "n_plus_one_requests": 0,
+            "last_n_plus_one": None
+        }
+    totals["requests"] += 1
+    totals["commands"] += stats.commands
+    totals["max_commands"] = max(totals["max_commands"], stats.commands)
+    totals["bytes_sent"] += stats.bytes_sent
+    totals["bytes_received"] += stats.bytes_received
+    totals["db_time"] += stats.db_time
+    
+    if stats.shapes:
+        shape, repeats = max(stats.shapes.items(), key=lambda entry: entry[1])
+        if repeats > N_PLUS_ONE_THRESHOLD:
+            totals["n_plus_one_requests"] += 1
+            totals["last_n_plus_one"] = {"shape": shape, "repeats": repeats}
+            logger.warning(f"Possible N+1 on {method} {route}: '{shape}' issued {repeats} times in one request")
+    
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        logger.warning(
+            f"Slow request {method} {route}: {elapsed:.3f}s, {stats.commands} db commands, "
+            f"{stats.db_time:.3f}s db time, {stats.bytes_sent}B sent, {stats.bytes_received}B received"
+        )
+
+def log_access(scope: dict, route: str, status_code: int, elapsed: float, stats: RequestDbStats, context: RequestContext):
+    """Queue a structured access record, sampling successful fast requests to high-volume routes"""
+    method = scope["method"]
+    always = status_code >= 400 or elapsed >= SLOW_REQUEST_SECONDS
+    sample_rate = 1.0 if always or (method, route) not in HIGH_VOLUME_ROUTES else ACCESS_LOG_SAMPLE_RATE
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    client_addr = scope.get("client")
+    access_logger.info("access", extra={"access": {
+        "request_id": context.request_id,
+        "method": method,
+        "route": route,
+        "path": scope["path"],
+        "status": status_code,
+        "duration_ms": round(elapsed * 1000, 2),
+        "db_commands": stats.commands,
+        "db_time_ms": round(stats.db_time * 1000, 2),
+        "user_id": context.user_id,
+        "client": client_addr[0] if client_addr else None,
+        "sample_rate": sample_rate
+    }})
+
+def route_template(scope: dict) -> str:
+    """Route path with placeholders (e.g. /api/items/{item_id}) to keep label cardinality bounded"""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request counts, status codes, latency and access logs"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        # Honour a correlation id set by a proxy, otherwise mint one
+        incoming_id = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")[:64]
+        context = RequestContext(incoming_id or uuid.uuid4().hex)
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", context.request_id.encode("latin-1"))]
+            await send(message)
+        
+        runtime_gauges["requests_in_flight"] += 1
+        db_stats = RequestDbStats()
+        db_stats_token = current_db_stats.set(db_stats)
+        context_token = current_request.set(context)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(context_token)
+            current_db_stats.reset(db_stats_token)
+            runtime_gauges["requests_in_flight"] -= 1
+            route = route_template(scope)
+            method = scope["method"]
+            count_key = (method, route, status_code)
+            request_counts[count_key] = request_counts.get(count_key, 0) + 1
+            histogram = request_latency.get((method, route))
+            if histogram is None:
+                histogram = request_latency[(method, route)] = Histogram()
+            histogram.observe(elapsed)
+            record_request_db_stats(method, route, elapsed, db_stats)
+            log_access(scope, route, status_code, elapsed, db_stats, context)
+
+async def monitor_event_loop_lag():
+    """Measure how late the loop wakes a sleeping task; sustained lag means blocking work on the loop"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - start - EVENT_LOOP_LAG_INTERVAL)
+        runtime_gauges["event_loop_lag_seconds"] = lag
+        event_loop_lag.observe(lag)
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = [
+        "# HELP http_requests_total Total HTTP requests by route template and status.",
+        "# TYPE http_requests_total counter"
+    ]
+    for (method, route, status), count in sorted(request_counts.items()):
+        lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+    
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by route template.",
+        "# TYPE http_request_duration_seconds histogram"
+    ]
+    for (method, route), histogram in sorted(request_latency.items()):
+        lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+    
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {runtime_gauges['requests_in_flight']}",
+        "# HELP event_loop_lag_seconds Most recent event loop scheduling delay.",
+        "# TYPE event_loop_lag_seconds gauge",
+        f"event_loop_lag_seconds {runtime_gauges['event_loop_lag_seconds']:.6f}",
+        "# HELP search_cache_requests_total Search cache lookups by result.",
+        "# TYPE search_cache_requests_total counter",
+        f'search_cache_requests_total{{result="hit"}} {search_cache_stats["hits"]}',
+        f'search_cache_requests_total{{result="miss"}} {search_cache_stats["misses"]}',
+        "# HELP search_cache_evictions_total Search results evicted to stay within SEARCH_CACHE_SIZE.",
+        "# TYPE search_cache_evictions_total counter",
+        f"search_cache_evictions_total {search_cache_stats['evictions']}",
+        "# HELP search_cache_entries Search results currently cached.",
+        "# TYPE search_cache_entries gauge",
+        f"search_cache_entries {len(search_cache)}",
+        "# HELP cache_invalidations_total Cache invalidations published to and applied from other workers.",
+        "# TYPE cache_invalidations_total counter",
+        f'cache_invalidations_total{{direction="published"}} {cache_coherence_stats["published"]}',
+        f'cache_invalidations_total{{direction="applied"}} {cache_coherence_stats["applied"]}',
+        "# HELP cache_invalidation_resyncs_total Times this worker dropped all caches after losing the broadcast cursor.",
+        "# TYPE cache_invalidation_resyncs_total counter",
+        f"cache_invalidation_resyncs_total {cache_coherence_stats['resyncs']}",
+        "# HELP log_records_dropped_total Log records dropped because the log queue was full.",
+        "# TYPE log_records_dropped_total counter",
+        f"log_records_dropped_total {log_queue_handler.dropped}",
+        "# HELP cold_start_seconds Seconds from module load until the app reported ready.",
+        "# TYPE cold_start_seconds gauge",
+        f"cold_start_seconds {startup_state['cold_start_seconds'] or 0}",
+        "# HELP event_loop_lag_distribution_seconds Event loop scheduling delay samples.",
+        "# TYPE event_loop_lag_distribution_seconds histogram"
+    ]
+    lines += event_loop_lag.render("event_loop_lag_distribution_seconds", "")
+    
+    db_metrics = [
+        ("db_commands_total", "commands", "Mongo commands issued while handling requests."),
+        ("db_time_seconds_total", "db_time", "Time spent in Mongo commands while handling requests."),
+        ("db_bytes_sent_total", "bytes_sent", "BSON bytes of Mongo commands sent."),
+        ("db_bytes_received_total", "bytes_received", "BSON bytes of Mongo replies received."),
+        ("db_n_plus_one_requests_total", "n_plus_one_requests", "Requests that repeated one command shape too often.")
+    ]
+    for name, field, help_text in db_metrics:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (method, route), totals in sorted(route_db_stats.items()):
+            lines.append(f'{name}{{method="{method}",route="{route}"}} {totals[field]}')
+    return "\n".join(lines) + "\n"
+
+@api_router.get("/admin/db-stats")
+async def admin_get_db_stats(admin: User = Depends(get_admin_user)):
+    """Per-route database round trips, time and N+1 flags, busiest routes first (admin only)"""
+    routes = [
+        {
+            "method": method,
+            "route": route,
+            **totals,
+            "avg_commands": round(totals["commands"] / totals["requests"], 2),
+            "avg_db_time": round(totals["db_time"] / totals["requests"], 6)
+        }
+        for (method, route), totals in route_db_stats.items()
+    ]
+    routes.sort(key=lambda r: r["avg_commands"], reverse=True)
+    lookups = search_cache_stats["hits"] + search_cache_stats["misses"]
+    return {
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "routes": routes,
+        "search_cache": {
+            **search_cache_stats,
+            "entries": len(search_cache),
+            "hit_rate": round(search_cache_stats["hits"] / lookups, 4) if lookups else None
+        }
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ============== PROFILING ==============
+
+# Fraction of requests profiled without being asked; admins can force one with the header
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_BUFFER_SIZE = int(os.environ.get("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_HEADER = "x-profile"
+# Innermost frames meaning the loop thread is parked waiting for I/O (e.g. a Mongo reply)
+IDLE_FRAMES = {"select", "poll", "run_forever", "run_until_complete"}
+
+profile_buffer: deque = deque(maxlen=PROFILE_BUFFER_SIZE)
+profiler_lock = threading.Lock()
+
+def collapse_stack(frame) -> str:
+    """One sample in collapsed-stack format, outermost frame first"""
+    if frame.f_code.co_name in IDLE_FRAMES:
+        return "[awaiting I/O]"
+    names = []
+    while frame is not None:
+        names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler(threading.Thread):
+    """Periodically snapshot one thread's Python stack and count identical stacks"""
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.stopped = threading.Event()
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = collapse_stack(frame)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+    
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+async def should_profile(scope: dict) -> Optional[str]:
+    """Why this request should be profiled ('header' or 'sample'), or None"""
+    headers = dict(scope.get("headers") or [])
+    if headers.get(PROFILE_HEADER.encode()) == b"1":
+        try:
+            await get_admin_user(Request(scope))
+            return "header"
+        except HTTPException:
+            pass
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+class ProfilingMiddleware:
+    """
+    Opt-in statistical profiler for individual requests.
+    
+    Samples the event loop thread while the request runs, so concurrent
+    requests on the same worker show up in its stacks too; the number in
+    flight is recorded with each profile. One profile runs at a time.
+    """
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        trigger = await should_profile(scope)
+        if trigger is None or not profiler_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        
+        profile_id = f"prof_{uuid.uuid4().hex[:12]}"
+        status_code = 500
+        
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+        
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL)
+        concurrent_requests = runtime_gauges["requests_in_flight"]
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            profiler_lock.release()
+            profile_buffer.append({
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "trigger": trigger,
+                "duration": round(time.perf_counter() - start, 6),
+                "interval": PROFILE_INTERVAL,
+                "samples": sampler.samples,
+                "concurrent_requests": concurrent_requests,
+                "started_at": started_at.isoformat(),
+                "stacks": sampler.stacks
+            })
+
+@api_router.get("/admin/profiles")
+async def admin_list_profiles(admin: User = Depends(get_admin_user)):
+    """Captured request profiles, newest first, without their stacks (admin only)"""
+    return [
+        {key: value for key, value in profile.items() if key != "stacks"}
+        for profile in reversed(profile_buffer)
+    ]
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def admin_get_profile(profile_id: str, admin: User = Depends(get_admin_user)):
+    """One profile as collapsed stacks, loadable by flamegraph.pl or speedscope (admin only)"""
+    profile = next((p for p in profile_buffer if p["profile_id"] == profile_id), None)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    lines = [f"{stack} {count}" for stack, count in sorted(profile["stacks"].items())]
+    return Response(
+        content="\n".join(lines) + "\n",
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+    )
+
 # ============== ROOT ==============
 
 @api_router.get("/")
@@ -1502,7 +3350,136 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the admin check for the profile header isn't billed to the route
+app.add_middleware(ProfilingMiddleware)
+
+# Long-running tasks started with the app and cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
+# Connections opened concurrently at startup so first requests don't pay for handshakes
+WARM_CONNECTIONS = int(os.environ.get("WARM_CONNECTIONS", "10"))
+READINESS_PING_TIMEOUT = 2.0
+
+startup_state = {"ready": False, "cold_start_seconds": None, "phases": {}}
+
+async def ensure_indexes():
+    # Two workers' first upserts of the change_seq or platform counter would otherwise create two documents
+    await db.counters.create_index("counter_id", unique=True)
+    await db.daily_rollups.create_index("day", unique=True)
+    await ensure_change_log()
+    if CACHE_BROADCAST:
+        await ensure_cache_invalidation_log()
+    await db.categories.create_index("path")
+    # compact_messages pages through the oldest messages by created_at
+    await db.messages.create_index("created_at")
+    await db.message_buckets.create_index("bucket_id", unique=True)
+    await db.locks.create_index("lock_id", unique=True)
+    await db.message_buckets.create_index([("conversation", 1), ("day", -1)])
+    await db.message_buckets.create_index([("participants", 1), ("last_at", -1)])
+    for field in CATEGORY_LEVEL_FIELDS:
+        await db.items.create_index(field)
+
+async def acquire_lock(lock_id: str, seconds: int) -> bool:
+    """Take a cluster-wide lock until released or for at most `seconds`; False if another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        # Matches only an expired lock; otherwise the upsert collides with the holder's document
+        await db.locks.update_one(
+            {"lock_id": lock_id, "expires_at": {"$lt": now.isoformat()}},
+            {"$set": {"worker": WORKER_ID, "expires_at": (now + timedelta(seconds=seconds)).isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def release_lock(lock_id: str):
+    await db.locks.delete_one({"lock_id": lock_id, "worker": WORKER_ID})
+
+async def preload_hot_data():
+    """Fill in-process caches and pull the landing page's documents into Mongo's cache"""
+    await backfill_category_paths()
+    # Users created before aggregates were stored would otherwise show no rating until an admin backfill.
+    # One worker runs it; the others start without waiting.
+    if await db.users.count_documents({"rating_sum": {"$exists": False}}, limit=1):
+        if await acquire_lock("rating_backfill", 3600):
+            try:
+                await backfill_rating_aggregates(only_missing=True)
+            finally:
+                await release_lock("rating_backfill")
+    await asyncio.gather(get_category_tree(), get_cached_settings(), get_announcements(), get_items())
+
+async def resume_deletion_jobs():
+    """Requeue jobs no live worker holds, such as ones interrupted by a restart"""
+    unfinished = await db.deletion_jobs.find(
+        claimable_deletion_jobs_query(),
+        {"_id": 0, "job_id": 1}
+    ).sort("created_at", 1).to_list(None)
+    for job in unfinished:
+        deletion_queue.put_nowait(job["job_id"])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the app before it reports ready, then stop background work on shutdown"""
+    lifespan_started = time.perf_counter()
+    phases = startup_state["phases"]
+    phases["import"] = round(lifespan_started - MODULE_LOADED_AT, 4)
+    steps = [
+        ("connect", lambda: asyncio.gather(*[client.admin.command("ping") for _ in range(WARM_CONNECTIONS)])),
+        ("indexes", ensure_indexes),
+        ("preload", preload_hot_data),
+        ("resume_jobs", resume_deletion_jobs)
+    ]
+    for name, step in steps:
+        step_started = time.perf_counter()
+        await step()
+        phases[name] = round(time.perf_counter() - step_started, 4)
+    
+    background_tasks.append(asyncio.create_task(account_deletion_worker()))
+    background_tasks.append(asyncio.create_task(counter_reconciliation_loop()))
+    background_tasks.append(asyncio.create_task(message_archive_loop()))
+    background_tasks.append(asyncio.create_task(monitor_event_loop_lag()))
+    if CACHE_BROADCAST:
+        background_tasks.append(asyncio.create_task(publish_cache_invalidations()))
+        background_tasks.append(asyncio.create_task(follow_cache_invalidations()))
+    
+    startup_state["cold_start_seconds"] = round(time.perf_counter() - MODULE_LOADED_AT, 4)
+    startup_state["ready"] = True
+    logger.info(f"Ready in {startup_state['cold_start_seconds']}s ({', '.join(f'{k} {v}s' for k, v in phases.items())})")
+    
+    yield
+    
+    # Fail readiness first so the load balancer drains this instance
+    startup_state["ready"] = False
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
     client.close()
+    # Flush queued log records
+    log_listener.stop()
+
+# The app is created before its routes, so attach the lifespan here rather than in FastAPI()
+app.router.lifespan_context = lifespan
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: startup warm-up finished and MongoDB answers a ping"""
+    body = {
+        "ready": startup_state["ready"],
+        "cold_start_seconds": startup_state["cold_start_seconds"],
+        "phases": startup_state["phases"]
+    }
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READINESS_PING_TIMEOUT)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={**body, "ready": False, "error": str(e)})
+    return body
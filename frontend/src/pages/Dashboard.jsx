@@ -16,45 +16,31 @@ const Dashboard = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [owners, setOwners] = useState({});
 
-  const fetchItems = useCallback(async () => {
+  const fetchPage = useCallback(async () => {
     try {
+      // Items (with owner summaries) and categories in one round trip
       const params = selectedCategory ? { category: selectedCategory } : {};
-      const response = await axios.get(`${API}/items`, { params, withCredentials: true });
-      setItems(response.data);
+      const response = await axios.get(`${API}/pages/dashboard`, { params, withCredentials: true });
+      setItems(response.data.items);
+      setCategories(response.data.categories);
 
-      // Fetch owner info for each item
-      const ownerIds = [...new Set(response.data.map((item) => item.user_id))];
-      const ownerPromises = ownerIds.map((id) =>
-        axios.get(`${API}/users/${id}`, { withCredentials: true }).catch(() => null)
-      );
-      const ownerResponses = await Promise.all(ownerPromises);
       const ownerMap = {};
-      ownerResponses.forEach((res) => {
-        if (res?.data) {
-          ownerMap[res.data.user_id] = res.data;
+      response.data.items.forEach((item) => {
+        if (item.owner) {
+          ownerMap[item.user_id] = item.owner;
         }
       });
       setOwners(ownerMap);
     } catch (error) {
-      console.error("Failed to fetch items:", error);
+      console.error("Failed to fetch dashboard:", error);
     } finally {
       setIsLoading(false);
     }
   }, [API, selectedCategory]);
 
-  const fetchCategories = useCallback(async () => {
-    try {
-      const response = await axios.get(`${API}/categories`, { withCredentials: true });
-      setCategories(response.data);
-    } catch (error) {
-      console.error("Failed to fetch categories:", error);
-    }
-  }, [API]);
-
   useEffect(() => {
-    fetchItems();
-    fetchCategories();
-  }, [fetchItems, fetchCategories]);
+    fetchPage();
+  }, [fetchPage]);
 
   // Filter items by search query
   const filteredItems = items.filter((item) => {
@@ -39,10 +39,10 @@ const Messages = () => {
     try {
       const [messagesRes, partnerRes] = await Promise.all([
         axios.get(`${API}/messages/${partnerId}`, { withCredentials: true }),
-        axios.get(`${API}/users/${partnerId}`, { withCredentials: true }),
+        axios.get(`${API}/users/batch`, { params: { ids: partnerId }, withCredentials: true }),
       ]);
       setMessages(messagesRes.data);
-      setPartner(partnerRes.data);
+      setPartner(partnerRes.data[0] || null);
     } catch (error) {
       console.error("Failed to fetch messages:", error);
       toast.error("Failed to load messages");
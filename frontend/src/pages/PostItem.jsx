@@ -52,62 +52,39 @@ const PostItem = () => {
   });
   const [isSubmittingRequest, setIsSubmittingRequest] = useState(false);
 
+  // The whole hierarchy arrives in one request; lower levels are read from it
   const fetchCategories = useCallback(async () => {
     try {
-      const response = await axios.get(`${API}/categories?level=0`, { withCredentials: true });
+      const response = await axios.get(`${API}/categories/tree`, { withCredentials: true });
       setCategories(response.data);
     } catch (error) {
       console.error("Failed to fetch categories:", error);
     }
   }, [API]);
 
-  const fetchSubcategories = useCallback(async (parent) => {
-    if (!parent) {
-      setSubcategories([]);
-      return;
-    }
-    try {
-      const response = await axios.get(`${API}/categories?level=1&parent=${parent}`, { withCredentials: true });
-      setSubcategories(response.data);
-    } catch (error) {
-      console.error("Failed to fetch subcategories:", error);
-    }
-  }, [API]);
-
-  const fetchBottomCategories = useCallback(async (parent) => {
-    if (!parent) {
-      setBottomCategories([]);
-      return;
-    }
-    try {
-      const response = await axios.get(`${API}/categories?level=2&parent=${parent}`, { withCredentials: true });
-      setBottomCategories(response.data);
-    } catch (error) {
-      console.error("Failed to fetch bottom categories:", error);
-    }
-  }, [API]);
-
   useEffect(() => {
     fetchCategories();
   }, [fetchCategories]);
 
   useEffect(() => {
     if (formData.category) {
-      fetchSubcategories(formData.category);
+      const node = categories.find((cat) => cat.name === formData.category);
+      setSubcategories(node ? node.children : []);
       setFormData(prev => ({ ...prev, subcategory: "", bottom_category: "" }));
     } else {
       setSubcategories([]);
     }
-  }, [formData.category, fetchSubcategories]);
+  }, [formData.category, categories]);
 
   useEffect(() => {
     if (formData.subcategory) {
-      fetchBottomCategories(formData.subcategory);
+      const node = subcategories.find((cat) => cat.name === formData.subcategory);
+      setBottomCategories(node ? node.children : []);
       setFormData(prev => ({ ...prev, bottom_category: "" }));
     } else {
       setBottomCategories([]);
     }
-  }, [formData.subcategory, fetchBottomCategories]);
+  }, [formData.subcategory, subcategories]);
 
   const handleImageChange = async (e) => {
     const file = e.target.files?.[0];
@@ -53,17 +53,13 @@ const Profile = () => {
 
   const fetchProfile = useCallback(async () => {
     try {
-      const [userRes, itemsRes, portfolioRes, settingsRes] = await Promise.all([
-        axios.get(`${API}/users/${userId}`, { withCredentials: true }),
-        axios.get(`${API}/items`, { params: { user_id: userId }, withCredentials: true }),
-        axios.get(`${API}/users/${userId}/portfolio`, { withCredentials: true }),
-        axios.get(`${API}/settings`, { withCredentials: true }),
-      ]);
-      setProfileUser(userRes.data);
-      setItems(itemsRes.data);
-      setPortfolio(portfolioRes.data);
-      setSettings(settingsRes.data);
-      setEditUsername(userRes.data.username || "");
+      const response = await axios.get(`${API}/pages/profile/${userId}`, { withCredentials: true });
+      const { user, items, portfolio, settings } = response.data;
+      setProfileUser(user);
+      setItems(items);
+      setPortfolio(portfolio);
+      setSettings(settings);
+      setEditUsername(user.username || "");
     } catch (error) {
       console.error("Failed to fetch profile:", error);
       toast.error("Failed to load profile");